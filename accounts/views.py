@@ -5,6 +5,8 @@ from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
 from django.views.generic import CreateView
 
+from party.models import get_active_party
+
 
 class SignUpView(CreateView):
     form_class = UserCreationForm
@@ -16,7 +18,10 @@ class LoginView(DjangoLoginView):
     success_url = reverse_lazy('party')
 
     def get_success_url(self):
-        return self.request.GET.get('next', self.success_url)
+        if 'next' in self.request.GET:
+            return self.request.GET['next']
+        # Users are redirected to the active party, if there is one
+        return self.success_url if get_active_party() else reverse_lazy('entries')
 
 
 def logout_view(request):
@@ -0,0 +1,63 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from party.models import Entry
+from party.testing import create_compo
+
+
+def slide_html(content, entry):
+    # The cached part of the slide of the entry
+    match = re.search(rf'<div data-entry-pos="{entry.order}" class="slide[^"]*">(.*?)</div>\s*(?=<div (?:class="slide|data-entry-pos)|</header>)', content, re.S)
+    return match.group(1)
+
+
+class SlideTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(self.admin)
+        self.compo = create_compo()
+
+    def create_entries(self, count):
+        for i in range(count):
+            Entry(title=f'Entry {i}', team='Team', compo=self.compo, order=i + 1, owner=self.admin).save()
+
+    def render_slideshow(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('control-beamer', args=[self.compo.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode(), len(queries)
+
+    def test_query_count_does_not_grow_with_entries(self):
+        self.create_entries(2)
+        _, few = self.render_slideshow()
+        self.create_entries(20)
+        _, many = self.render_slideshow()
+        self.assertEqual(few, many)
+
+    def test_preview_is_identical_to_slideshow(self):
+        self.create_entries(2)
+        entry = self.compo.entries.last()
+        slideshow, _ = self.render_slideshow()
+        preview = self.client.get(reverse('preview-entry', args=[entry.pk])).content.decode()
+        self.assertEqual(slide_html(preview, entry), slide_html(slideshow, entry))
+        self.assertIn('DEMO', slide_html(preview, entry))
+
+    def test_changes_are_rendered(self):
+        self.create_entries(1)
+        entry = self.compo.entries.get()
+        self.render_slideshow()
+
+        entry.title = 'Renamed'
+        entry.save()
+        self.compo.title = 'Other'
+        self.compo.save()
+        slideshow, _ = self.render_slideshow()
+        self.assertIn('Renamed', slide_html(slideshow, entry))
+        self.assertIn('OTHER', slide_html(slideshow, entry))
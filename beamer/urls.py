@@ -5,5 +5,6 @@ from beamer import views
 
 urlpatterns = [
     path('compo-slideshow/<int:pk>', views.CompoSlideshow.as_view(), name='control-beamer'),
+    path('compo-slideshow/<int:pk>/events', views.beamer_events, name='beamer-events'),
     path('preview/<int:pk>', views.PreviewEntry.as_view(), name='preview-entry'),
 ]
@@ -1,13 +1,43 @@
+from asgiref.sync import sync_to_async
+
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, Http404
 from django.shortcuts import render
 from django.views.generic.detail import DetailView
 
 from party.models import Compo, Entry
 from party.mixins import StaffRequiredMixin, OwnerRequiredMixin
+from vote import live
 
 class CompoSlideshow(StaffRequiredMixin, DetailView):
+    """
+    Controls the beamer with the arrow keys, or with ?mirror follows the slides
+    shown by the controlling slideshow, e.g. on a second screen
+    """
     model = Compo
     template_name = 'beamer/slideshow.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['mirror'] = 'mirror' in self.request.GET
+        context['live_state'] = live.get_state(self.object.pk)
+        return context
+
 class PreviewEntry(OwnerRequiredMixin, DetailView):
-    model = Entry
-    template_name = 'beamer/preview.html'
\ No newline at end of file
+    queryset = Entry.objects.select_related('compo')
+    template_name = 'beamer/preview.html'
+
+async def beamer_events(request, pk):
+    """Server-sent event stream of the live state of the compo for mirrored slideshows"""
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    if not user.is_staff:
+        raise PermissionDenied
+
+    if await sync_to_async(live.get_state)(pk) is None:
+        raise Http404
+
+    return live.event_stream(pk)
@@ -2,5 +2,13 @@
 
 python manage.py collectstatic --noinput
 python manage.py migrate
+# Migrations that rebuild the vote table on SQLite drop the score tally triggers
+python manage.py rebuild_scores --check || python manage.py rebuild_scores
+# The live state kept under RUNTIME_DIR may be from another copy of the database
+python manage.py rebuild_live_state
 
-exec gunicorn --bind 0.0.0.0:8000 pms.wsgi
+# Background task worker, restarted if it exits
+(while true; do python manage.py run_tasks; sleep 5; done) &
+
+# ASGI workers so that live vote event streams don't block a worker each
+exec gunicorn --bind 0.0.0.0:8000 --worker-class uvicorn_worker.UvicornWorker pms.asgi
@@ -1,34 +1,35 @@
-import tempfile
-import zipfile
-import zipfly
 import os
-from io import BytesIO
-from stat import S_IFREG
 from adminsortable2.admin import SortableStackedInline, SortableAdminBase
 
 from django.contrib import admin
-from django.http import HttpResponse, StreamingHttpResponse
+from django.contrib.admin.views.main import ChangeList
 from django.shortcuts import reverse, redirect
+from django.db.models.functions import Coalesce
 from django.urls import path
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 
+from party.exports import zip_response, compo_export_response
+from party.inspection import ENTRY_POINTS
 from party.models import Entry, Party, Compo, CompoVotingStatus
+from party.results import party_results
+from pms.changelists import EstimatedCountPaginator
 
 
 @admin.action(description="Export selected entries as zip")
 def export_entries(modeladmin, request, queryset):
     """Exports selected entries from ModelAdmin"""
-    buffer = BytesIO()
+    paths = []
 
-    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
-        for entry in queryset.all():
-            filename = os.path.basename(entry.sub_file.name)
-            archive.write(entry.sub_file.path, filename)
+    for entry in queryset.all():
+        if entry.sub_file:
+            paths.append(
+                {
+                    'fs': entry.sub_file.path,
+                    'n': os.path.basename(entry.sub_file.name)
+                }
+            )
 
-    buffer.seek(0)
-    response = HttpResponse(buffer.read(), content_type='application/x-zip-compressed')
-    response['Content-Disposition'] = 'attachment; filename=entries.zip'
-    return response
+    return zip_response(paths, 'entries.zip')
 
 
 class InlineEntryAdmin(SortableStackedInline):
@@ -37,10 +38,85 @@ class InlineEntryAdmin(SortableStackedInline):
     can_delete = False
     max_num = 0
 
+class EntryChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+
+        # Rank the listed entries with one results query per party
+        results = {}
+        for entry in self.result_list:
+            party_id = entry.compo.party_id
+            if party_id not in results:
+                results[party_id] = party_results(party_id)
+            entry.placement = results[party_id].placement(entry.pk)
+
+
 @admin.register(Entry)
 class EntryAdmin(admin.ModelAdmin):
     model = Entry
-    list_display = ['__str__', 'entry_total_points']
+    list_display = ['thumbnail_preview', '__str__', 'points', 'vote_count', 'rank', 'file_check']
+    list_filter = ['compo__party__title', 'compo__title']
+    readonly_fields = ['file_manifest']
+    list_select_related = ['compo__party']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [export_entries]
+
+    def get_changelist(self, request, **kwargs):
+        return EntryChangeList
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            total_points=Coalesce('score__total', 0),
+            total_votes=Coalesce('score__vote_count', 0),
+        )
+
+    @admin.display(description='Points', ordering='total_points')
+    def points(self, entry):
+        return entry.total_points
+
+    @admin.display(description='Votes', ordering='total_votes')
+    def vote_count(self, entry):
+        return entry.total_votes
+
+    @admin.display(description='Rank')
+    def rank(self, entry):
+        placement = getattr(entry, 'placement', None)
+        return placement.rank if placement else None
+
+    @admin.display(description='Thumbnail')
+    def thumbnail_preview(self, entry):
+        renditions = entry.thumbnail_renditions
+        if not renditions:
+            return 'Not processed' if entry.thumbnail else None
+        return format_html('<img src="{}" width="160" height="90" loading="lazy">', renditions['small']['webp'])
+
+    @admin.display(description='File')
+    def file_check(self, entry):
+        problems = entry.submission_problems
+        if problems is None:
+            return 'Not checked' if entry.sub_file else '-'
+        if problems:
+            return format_html('<span title="{}">✗ {}</span>', '\n'.join(problems), problems[0])
+        return f"✓ {entry.manifest['file_count']} files, {entry.manifest['uncompressed_size'] / 1024 / 1024:.1f} MB"
+
+    @admin.display(description='File contents')
+    def file_manifest(self, entry):
+        problems = entry.submission_problems
+        if problems is None:
+            return 'Not checked yet'
+        manifest = entry.manifest
+        return format_html(
+            '<p>{}</p><p>{} files, {} MB compressed, {} MB extracted</p><ul>{}</ul>',
+            '; '.join(problems) or 'No problems found',
+            manifest['file_count'],
+            f"{manifest['compressed_size'] / 1024 / 1024:.1f}",
+            f"{manifest['uncompressed_size'] / 1024 / 1024:.1f}",
+            format_html_join('', '<li>{}: {}</li>', (
+                (description, ', '.join(manifest['entry_points'][name]) or '-')
+                for name, description in ENTRY_POINTS.items()
+            )),
+        )
 
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -102,25 +178,7 @@ class CompoAdmin(SortableAdminBase, admin.ModelAdmin):
     
     def export_entries(self, request, compo_pk):
         compo = self.get_object(request, compo_pk)
-
-        paths = []
-
-        for entry in compo.entries.all():
-            if entry.sub_file:
-                paths.append(
-                    {
-                        'fs': entry.sub_file.path,
-                        'n': f"{entry.order} {os.path.basename(entry.sub_file.name)}"
-                    }
-                )
-        
-        zfly = zipfly.ZipFly(paths=paths)
-        generator = zfly.generator()
-
-        response = StreamingHttpResponse(generator, content_type='application/zip')
-        response['Content-Disposition'] = 'attachment; filename="entries.zip"'
-
-        return response
+        return compo_export_response(request, compo)
     
     export_entries_button.short_description = 'Export entries'
 
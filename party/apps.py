@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PartyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'party'
+
+    def ready(self):
+        from party import checks, signals  # noqa: F401
@@ -0,0 +1,28 @@
+import re
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+HTMX_PATH = settings.BASE_DIR / 'static' / 'vendor' / 'htmx.min.js'
+
+
+def vendored_htmx_version():
+    try:
+        match = re.search(r'version:\s*"([\d.]+)"', HTMX_PATH.read_text())
+    except FileNotFoundError:
+        return None
+    return match and match[1]
+
+
+@register()
+def check_vendored_htmx(app_configs, **kwargs):
+    """The vendored htmx has to be the pinned version, so that self-hosting doesn't change it unnoticed"""
+    version = vendored_htmx_version()
+    if version != settings.HTMX_VERSION:
+        return [Warning(
+            f"static/vendor/htmx.min.js is htmx {version}, but HTMX_VERSION is {settings.HTMX_VERSION}",
+            hint="Run python manage.py vendor_htmx",
+            id='party.W001',
+        )]
+    return []
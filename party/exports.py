@@ -0,0 +1,164 @@
+"""
+Zip exports of entries.
+
+Every compo has a prebuilt archive on disk, named after a hash of its manifest
+(files, their order, sizes and modification times). It is rebuilt in
+the background when an entry changes and served with HTTP Range support, so
+repeated and interrupted downloads are plain file serves.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+
+import zipfly
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+from party.models import Compo
+from tasks.queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+
+def zip_response(paths, filename):
+    """
+    Streams the files as a zip archive without holding it in memory.
+
+    Entries are zip files already, so members are stored instead of compressed again.
+    That also makes the archive size known up front, so Content-Length is set when
+    zipfly can predict it (archives under 2 GB).
+    """
+    storesize = sum(os.path.getsize(path['fs']) for path in paths)
+    zfly = zipfly.ZipFly(paths=paths, storesize=storesize)
+
+    response = StreamingHttpResponse(zfly.generator(), content_type='application/zip')
+    try:
+        response['Content-Length'] = zfly.buffer_prediction_size()
+    except zipfly.LargePredictionSize:
+        pass
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def compo_paths(compo):
+    paths = []
+    for entry in compo.entries.all():
+        if entry.sub_file:
+            if not os.path.isfile(entry.sub_file.path):
+                # E.g. a database restored without its media, the other entries are still exported
+                logger.warning("File %s of entry %s is missing, left out of the export", entry.sub_file.name, entry.pk)
+                continue
+            paths.append(
+                {
+                    'fs': entry.sub_file.path,
+                    'n': f"{entry.order} {os.path.basename(entry.sub_file.name)}"
+                }
+            )
+    return paths
+
+
+def manifest_key(paths):
+    """Hash of the archive contents, changes whenever a file is added, renamed, reordered or modified"""
+    manifest = []
+    for path in paths:
+        stat = os.stat(path['fs'])
+        manifest.append([path['fs'], path['n'], stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha256(json.dumps(manifest).encode()).hexdigest()[:16]
+
+
+def archive_path(compo_pk, key):
+    return Path(settings.EXPORTS_DIR) / f'compo-{compo_pk}-{key}.zip'
+
+
+def build_compo_archive(compo_pk):
+    """Builds the archive of the compo unless the current one is up to date, and removes outdated ones"""
+    exports_dir = Path(settings.EXPORTS_DIR)
+    exports_dir.mkdir(parents=True, exist_ok=True)
+
+    # Only one process builds the archives of a compo at a time
+    with open(exports_dir / f'compo-{compo_pk}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        compo = Compo.objects.filter(pk=compo_pk).first()
+        if compo is None:
+            paths, path = [], None
+        else:
+            paths = compo_paths(compo)
+            path = archive_path(compo_pk, manifest_key(paths))
+
+        if path is not None and not path.exists():
+            tmp_path = path.with_name(f'{path.name}.tmp')
+            with open(tmp_path, 'wb') as archive:
+                for chunk in zipfly.ZipFly(paths=paths).generator():
+                    archive.write(chunk)
+            os.replace(tmp_path, path)
+
+        for old_path in exports_dir.glob(f'compo-{compo_pk}-*.zip'):
+            if old_path != path:
+                old_path.unlink(missing_ok=True)
+
+
+def compo_export_response(request, compo):
+    """Serves the prebuilt archive of the compo, or streams it while the archive is being rebuilt"""
+    paths = compo_paths(compo)
+    key = manifest_key(paths)
+    try:
+        # Opened right away, a rebuild may remove the archive at any moment
+        file = open(archive_path(compo.pk, key), 'rb')
+    except FileNotFoundError:
+        enqueue(build_compo_archive, compo.pk, key=f'export-{compo.pk}')
+        return zip_response(paths, 'entries.zip')
+    return ranged_file_response(request, file, 'entries.zip', etag=f'"{key}"')
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def ranged_file_response(request, file, filename, etag):
+    """Serves an open file with support for single-range requests so that interrupted downloads can resume"""
+    size = os.fstat(file.fileno()).st_size
+
+    match = RANGE_RE.match(request.headers.get('Range', '').strip())
+    if_range = request.headers.get('If-Range')
+    if match is None or (if_range is not None and if_range != etag) or match.groups() == ('', ''):
+        response = FileResponse(file, as_attachment=True, filename=filename, content_type='application/zip')
+    else:
+        start, end = match.groups()
+        if start:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        else:
+            # Suffix range: the last n bytes
+            start = max(size - int(end), 0)
+            end = size - 1
+
+        if start >= size or start > end:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        file.seek(start)
+        response = StreamingHttpResponse(_read_range(file, end - start + 1), status=206, content_type='application/zip')
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
+
+
+def _read_range(file, length, chunk_size=FileResponse.block_size):
+    with file:
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
@@ -1,8 +1,9 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django import forms
-from django.utils import timezone
 
-from party.models import Entry
+from party.models import Entry, Upload
+from party.uploads import attach_upload
 
 
 class EntryForm(forms.ModelForm):
@@ -23,21 +24,35 @@ class EntryForm(forms.ModelForm):
             'exits_automatically': forms.CheckboxInput()
         }
 
+    upload = forms.ModelChoiceField(queryset=Upload.objects.none(), required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A completed chunked upload of the user replaces sub_file
+        self.fields['upload'].queryset = Upload.objects.filter(owner=user, completed_at__isnull=False)
+        # The chunks are hashed in the browser to compute the checksum of the file
+        self.fields['upload'].widget.attrs['data-chunk-size'] = settings.UPLOAD_CHUNK_SIZE
+
     def clean(self):
         cleaned_data = super().clean()
         compo = cleaned_data['compo'] 
-        now = timezone.now()
-        
-        # check for submission_deadline and metadata_deadline
-        initial_sub_file = self.initial.get('sub_file')
-        cleaned_sub_file = self.cleaned_data.get('sub_file')
-
-        changed_data = self.changed_data
-        if 'sub_file' in self.changed_data and now > compo.submission_deadline:
-            raise ValidationError("The deadline for submitting a file has passed. You can still edit the other information of your entry. If your issue is critical, please contact the organizers")
-
-        
-        if now > compo.metadata_deadline:
-            raise ValidationError("The deadline for the compo has passed, you can't edit or submit a new entry. If your issue is critical, please contact the organizers")
-        
+        upload = cleaned_data.get('upload')
+
+        # The deadlines of chunked uploads were checked when the upload started
+        if upload is not None:
+            if upload.compo != compo:
+                raise ValidationError("The file was uploaded for another compo, please upload it again")
+            compo.check_deadlines(file_changed=False)
+        else:
+            compo.check_deadlines(file_changed='sub_file' in self.changed_data)
+
         return cleaned_data
+
+    def save(self, commit=True):
+        upload = self.cleaned_data.get('upload')
+        if upload is None or not commit:
+            return super().save(commit)
+        entry = attach_upload(upload, self.instance)
+        self._save_m2m()
+        return entry
+
@@ -0,0 +1,147 @@
+"""
+Inspection of submitted entry files.
+
+Submitted zips are read in the background after upload without extracting
+them: the central directory gives the file count and sizes, and every member
+is decompressed in a stream to check its CRC. The result is stored as the
+manifest of the entry together with the hash of the file, so a file is only
+inspected again when its content changes.
+"""
+import hashlib
+import zipfile
+import zlib
+
+from django.conf import settings
+from django.utils import timezone
+
+
+READ_SIZE = 1024 * 1024
+
+# Entry points found in the files, by the names used in Entry.manifest
+ENTRY_POINTS = {
+    'index_html': "index.html",
+    'windows': "Windows executable",
+    'linux': "Linux executable",
+}
+
+# Listed in the manifest per kind of entry point
+MAX_LISTED = 20
+
+ELF_MAGIC = b'\x7fELF'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while data := file.read(READ_SIZE):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def is_linux_executable(info, head):
+    # Executable bits are only stored by zips made on Unix
+    unix_mode = info.external_attr >> 16 if info.create_system == 3 else 0
+    return head == ELF_MAGIC or bool(unix_mode & 0o111) or info.filename.endswith(('.sh', '.x86_64', '.AppImage'))
+
+
+def inspect_zip(path):
+    """Returns the manifest of the zip file at path"""
+    manifest = {
+        'inspected_at': timezone.now().isoformat(),
+        'errors': [],
+        'file_count': 0,
+        'compressed_size': 0,
+        'uncompressed_size': 0,
+        'entry_points': {name: [] for name in ENTRY_POINTS},
+    }
+    errors = manifest['errors']
+
+    try:
+        archive = zipfile.ZipFile(path)
+    except (zipfile.BadZipFile, OSError) as error:
+        errors.append(f"Not a valid zip file: {error}")
+        return manifest
+
+    with archive:
+        files = [info for info in archive.infolist() if not info.is_dir()]
+        manifest['file_count'] = len(files)
+        manifest['compressed_size'] = sum(info.compress_size for info in files)
+        manifest['uncompressed_size'] = sum(info.file_size for info in files)
+
+        if manifest['file_count'] > settings.ENTRY_MAX_FILE_COUNT:
+            errors.append(f"Too many files: {manifest['file_count']}, at most {settings.ENTRY_MAX_FILE_COUNT} are allowed")
+        if manifest['uncompressed_size'] > settings.ENTRY_MAX_UNCOMPRESSED_SIZE:
+            errors.append(
+                f"Too large when extracted: {manifest['uncompressed_size'] // 1024 // 1024} MB, "
+                f"at most {settings.ENTRY_MAX_UNCOMPRESSED_SIZE // 1024 // 1024} MB is allowed"
+            )
+        if errors:
+            # Not decompressed, it could be a zip bomb
+            return manifest
+
+        # Shallowest first, so the main entry point is listed first
+        for info in sorted(files, key=lambda info: (info.filename.count('/'), info.filename)):
+            try:
+                with archive.open(info) as member:
+                    head = member.read(len(ELF_MAGIC))
+                    # Reading to the end verifies the CRC
+                    while member.read(READ_SIZE):
+                        pass
+            except (zipfile.BadZipFile, zlib.error, EOFError) as error:
+                errors.append(f"{info.filename} is corrupted: {error}")
+                continue
+            except (NotImplementedError, RuntimeError) as error:
+                # Unsupported compression method or encrypted
+                errors.append(f"{info.filename} can't be read: {error}")
+                continue
+
+            name = info.filename.rsplit('/', 1)[-1].lower()
+            entry_points = manifest['entry_points']
+            if name == 'index.html':
+                entry_points['index_html'].append(info.filename)
+            if name.endswith('.exe'):
+                entry_points['windows'].append(info.filename)
+            if is_linux_executable(info, head):
+                entry_points['linux'].append(info.filename)
+
+    for name, paths in manifest['entry_points'].items():
+        del paths[MAX_LISTED:]
+    return manifest
+
+
+def manifest_problems(manifest, entry_point):
+    """Problems of the file for an entry that needs the given kind of entry point (or None)"""
+    problems = list(manifest['errors'])
+    if not problems and entry_point is not None and not manifest['entry_points'][entry_point]:
+        problems.append(f"No {ENTRY_POINTS[entry_point]} found")
+    return problems
+
+
+def inspect_file(path):
+    """Returns the hash and manifest of the file, run in worker processes by inspect_entries"""
+    return file_sha256(path), inspect_zip(path)
+
+
+def save_manifest(entry_pk, name, sha256, manifest):
+    from party.models import Entry
+
+    manifest = {**manifest, 'sha256': sha256}
+    # Skipped if another file was uploaded in the meantime, its own inspection saves it
+    Entry.objects.filter(pk=entry_pk, sub_file=name).update(sub_file_hash=sha256, manifest=manifest)
+
+
+def inspect_entry(entry_pk):
+    """Inspects the submitted file of the entry unless a file with the same content was inspected already"""
+    from party.models import Entry
+
+    entry = Entry.objects.filter(pk=entry_pk).only('sub_file', 'manifest').first()
+    if entry is None or not entry.sub_file:
+        return
+
+    path = entry.sub_file.path
+    sha256 = file_sha256(path)
+    if entry.manifest is not None and entry.manifest.get('sha256') == sha256:
+        manifest = entry.manifest
+    else:
+        manifest = inspect_zip(path)
+    save_manifest(entry_pk, entry.sub_file.name, sha256, manifest)
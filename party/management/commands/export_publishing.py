@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from party import publishing
+from party.models import Party
+
+
+class Command(BaseCommand):
+    help = "Writes the publishing data of every entry of a party as JSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('party', help="Title of the party")
+        parser.add_argument('--format', choices=['json', 'csv'], default='json')
+        parser.add_argument('--output', help="File to write to instead of stdout")
+
+    def handle(self, *args, **options):
+        party = Party.objects.filter(title=options['party']).first()
+        if party is None:
+            raise CommandError(f"Party {options['party']} does not exist")
+
+        entries = publishing.party_publishing(party)
+        if options['format'] == 'csv':
+            data = publishing.as_csv(entries)
+        else:
+            data = json.dumps(publishing.as_json(party, entries), indent=2, ensure_ascii=False)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+                file.write(data)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {len(entries)} entries to {options['output']}"))
+        else:
+            self.stdout.write(data)
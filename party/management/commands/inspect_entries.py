@@ -0,0 +1,39 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from party.inspection import inspect_file, save_manifest
+from party.models import Entry
+
+
+class Command(BaseCommand):
+    help = "Inspects the submitted files of entries in parallel processes, e.g. all entries of a compo after the deadline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compo', type=int, help="Only inspect the entries of this compo")
+        parser.add_argument('--all', action='store_true', help="Inspect files that have been inspected already as well")
+        parser.add_argument('--workers', type=int, help="Number of processes, by default the number of CPUs")
+
+    def handle(self, *args, **options):
+        entries = Entry.objects.exclude(sub_file='')
+        if options['compo']:
+            entries = entries.filter(compo_id=options['compo'])
+        if not options['all']:
+            entries = entries.filter(sub_file_hash='')
+        entries = list(entries.values_list('pk', 'sub_file'))
+
+        # The worker processes only read the files, the results are saved here
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {
+                (pk, name): executor.submit(inspect_file, Entry.sub_file.field.storage.path(name))
+                for pk, name in entries
+            }
+            problem_count = 0
+            for (pk, name), future in futures.items():
+                sha256, manifest = future.result()
+                save_manifest(pk, name, sha256, manifest)
+                if manifest['errors']:
+                    problem_count += 1
+                    self.stdout.write(f"{name}: {'; '.join(manifest['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(f"Inspected {len(entries)} files, {problem_count} with errors"))
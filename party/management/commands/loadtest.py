@@ -0,0 +1,301 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from party.models import Party, Compo, Entry, CompoVotingStatus
+from vote.models import VoteKey
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, round(percent / 100 * len(values)) - 1)
+    return values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, endpoint, latency, status, queries, locked):
+        with self.lock:
+            self.samples[endpoint].append((latency, status, queries, locked))
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            endpoints[endpoint] = self.summarize(samples, duration)
+        everything = [sample for samples in self.samples.values() for sample in samples]
+        return {'total': self.summarize(everything, duration), 'endpoints': endpoints}
+
+    @staticmethod
+    def summarize(samples, duration):
+        if not samples:
+            return {'requests': 0}
+        latencies = [latency * 1000 for latency, _, _, _ in samples]
+        queries = [queries for _, _, queries, _ in samples if queries is not None]
+        return {
+            'requests': len(samples),
+            'throughput': round(len(samples) / duration, 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(max(latencies), 2),
+            'error_rate': round(sum(1 for _, status, _, _ in samples if status >= 500 or status == 0) / len(samples), 4),
+            'locked_rate': round(sum(1 for _, _, _, locked in samples if locked) / len(samples), 4),
+            'queries_per_request': round(statistics.mean(queries), 2) if queries else None,
+            'statuses': dict(Counter(str(status) for _, status, _, _ in samples)),
+        }
+
+
+class Client:
+    """Keep-alive HTTP client that records every request"""
+    def __init__(self, port, recorder, cookies):
+        self.port = port
+        self.recorder = recorder
+        self.cookies = cookies
+        self.connection = None
+
+    def request(self, endpoint, method, url, body=None, headers=None):
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items()), **(headers or {})}
+        # Like browsers, retry once when the server has closed an idle keep-alive connection
+        retry = self.connection is not None
+        while True:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            start = time.perf_counter()
+            try:
+                self.connection.request(method, url, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                self.connection.close()
+                self.connection = None
+                if retry:
+                    retry = False
+                    continue
+                self.recorder.record(endpoint, time.perf_counter() - start, 0, None, False)
+                return None
+        latency = time.perf_counter() - start
+
+        queries = response.getheader('X-Query-Count')
+        self.recorder.record(
+            endpoint, latency, response.status,
+            int(queries) if queries is not None else None,
+            response.getheader('X-Database-Locked') == '1',
+        )
+        return response
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a load test of a live compo against a throwaway database: "
+        "voters poll available entries and vote while a beamer advances the slides"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compos', type=int, default=4, help="Number of compos to create")
+        parser.add_argument('--entries', type=int, default=20, help="Number of entries per compo")
+        parser.add_argument('--keys', type=int, default=300, help="Number of vote keys, one simulated voter each")
+        parser.add_argument('--duration', type=float, default=60, help="Length of the test in seconds")
+        parser.add_argument('--poll-interval', type=float, default=2, help="Seconds between polls of each voter")
+        parser.add_argument('--vote-probability', type=float, default=0.2, help="Chance that a voter casts a vote after a poll")
+        parser.add_argument('--beamer-interval', type=float, default=5, help="Seconds between slide changes")
+        parser.add_argument('--workers', type=int, default=3, help="Number of gunicorn workers")
+        parser.add_argument('--worker-class', default='uvicorn_worker.UvicornWorker', help="Gunicorn worker class, e.g. sync")
+        parser.add_argument('--output', default='loadtest.json', help="File to write the results to as JSON")
+        parser.add_argument('--label', default='', help="Free form label stored with the results")
+        # Internal: seeds the throwaway database from the subprocess that uses it
+        parser.add_argument('--seed', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options)
+            return
+
+        with tempfile.TemporaryDirectory(prefix='pms-loadtest-') as tmp_dir:
+            env = self.server_env(Path(tmp_dir))
+            manage = [sys.executable, str(settings.BASE_DIR / 'manage.py')]
+
+            self.stdout.write("Migrating and seeding the throwaway database...")
+            subprocess.run([*manage, 'migrate', '--verbosity', '0'], env=env, check=True)
+            seed_path = Path(tmp_dir) / 'seed.json'
+            subprocess.run(
+                [*manage, 'loadtest', '--seed', str(seed_path),
+                 '--compos', str(options['compos']), '--entries', str(options['entries']), '--keys', str(options['keys'])],
+                env=env, check=True,
+            )
+            seed = json.loads(seed_path.read_text())
+
+            port = self.free_port()
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                 '--workers', str(options['workers']), '--worker-class', options['worker_class'],
+                 '--log-level', 'warning', 'pms.asgi' if 'uvicorn' in options['worker_class'] else 'pms.wsgi'],
+                cwd=settings.BASE_DIR, env=env,
+            )
+            try:
+                self.wait_for_server(port)
+                self.stdout.write(
+                    f"Running {options['keys']} voters against {options['workers']} workers for {options['duration']:g}s..."
+                )
+                recorder, duration = self.run_load(port, seed, options)
+            finally:
+                server.terminate()
+                server.wait()
+
+        results = {
+            'label': options['label'],
+            'started_at': timezone.now().isoformat(),
+            'config': {
+                name: options[name] for name in [
+                    'compos', 'entries', 'keys', 'duration', 'poll_interval', 'vote_probability',
+                    'beamer_interval', 'workers', 'worker_class',
+                ]
+            },
+            'duration': round(duration, 2),
+            **recorder.summary(duration),
+        }
+        Path(options['output']).write_text(json.dumps(results, indent=2))
+        self.print_results(results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def server_env(self, tmp_dir):
+        return {
+            **os.environ,
+            'DATABASE_PATH': str(tmp_dir / 'db.sqlite3'),
+            'RUNTIME_DIR': str(tmp_dir / 'run'),
+            'SECRET_KEY': secrets.token_urlsafe(32),
+            'ALLOWED_HOSTS': '127.0.0.1,localhost',
+            'CSRF_TRUSTED_ORIGINS': 'http://127.0.0.1',
+            'DEBUG': '0',
+            'QUERY_STATS': '1',
+        }
+
+    def seed(self, options):
+        party = Party.objects.create(title='Load test party')
+        deadline = timezone.now() + timedelta(days=1)
+        compos = []
+        for compo_number in range(options['compos']):
+            compo = Compo.objects.create(
+                title=f'Compo {compo_number}', party=party,
+                submission_deadline=deadline, metadata_deadline=deadline,
+                voting_status=CompoVotingStatus.LIVE if compo_number == 0 else CompoVotingStatus.OPEN,
+            )
+            for order in range(1, options['entries'] + 1):
+                Entry(title=f'Entry {order}', team='Load test', compo=compo, order=order, platform='WEB').save()
+            compos.append(compo)
+
+        keys = [secrets.token_hex(8) for _ in range(options['keys'])]
+        VoteKey.objects.bulk_create(VoteKey(party=party, key=key) for key in keys)
+
+        admin = User.objects.create_superuser('loadtest', password=secrets.token_urlsafe(16))
+        session = SessionStore()
+        session[SESSION_KEY] = str(admin.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = admin.get_session_auth_hash()
+        session.create()
+
+        live_compo = compos[0]
+        Path(options['seed']).write_text(json.dumps({
+            'compo_pk': live_compo.pk,
+            'entry_pks': list(live_compo.entries.values_list('pk', flat=True)),
+            'keys': keys,
+            'session_key': session.session_key,
+        }))
+
+    @staticmethod
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def wait_for_server(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/info/')
+                connection.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError("The server did not start")
+
+    def run_load(self, port, seed, options):
+        recorder = Recorder()
+        stop = threading.Event()
+        compo_pk = seed['compo_pk']
+        entry_pks = seed['entry_pks']
+        position = {'current': 1}
+
+        def voter(key):
+            client = Client(port, recorder, {'votekey': key})
+            etag = None
+            # Spread the voters over the poll interval like phones joining at different times
+            stop.wait(random.uniform(0, options['poll_interval']))
+            while not stop.is_set():
+                headers = {'If-None-Match': etag} if etag else {}
+                response = client.request('available-entries', 'GET', f'/vote/available-entries/{compo_pk}', headers=headers)
+                if response is not None and response.status == 200:
+                    etag = response.getheader('ETag')
+
+                if random.random() < options['vote_probability']:
+                    entry_pk = random.choice(entry_pks[:max(1, position['current'])])
+                    body = f'{entry_pk}-entry={entry_pk}&{entry_pk}-points={random.randint(0, 5)}'
+                    client.request('vote-entry', 'POST', f'/vote/entry/{entry_pk}', body=body, headers={
+                        'Content-Type': 'application/x-www-form-urlencoded',
+                    })
+                stop.wait(options['poll_interval'])
+
+        def beamer():
+            client = Client(port, recorder, {'sessionid': seed['session_key']})
+            seq = time.time_ns() // 1_000_000
+            while not stop.is_set():
+                seq += 1
+                body = json.dumps({'compo_pk': compo_pk, 'current_entry': position['current'], 'seq': seq})
+                client.request('record-entry-pos', 'POST', '/vote/record-entry-pos/', body=body, headers={
+                    'Content-Type': 'application/json',
+                })
+                position['current'] = position['current'] % len(entry_pks) + 1
+                stop.wait(options['beamer_interval'])
+
+        threads = [threading.Thread(target=voter, args=[key], daemon=True) for key in seed['keys']]
+        threads.append(threading.Thread(target=beamer, daemon=True))
+
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        stop.wait(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return recorder, time.monotonic() - start
+
+    def print_results(self, results):
+        columns = ['requests', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate', 'locked_rate', 'queries_per_request']
+        self.stdout.write(f"{'endpoint':<20}" + ''.join(f'{column:>20}' for column in columns))
+        rows = [*results['endpoints'].items(), ('total', results['total'])]
+        for endpoint, summary in rows:
+            self.stdout.write(f'{endpoint:<20}' + ''.join(f"{str(summary.get(column, '')):>20}" for column in columns))
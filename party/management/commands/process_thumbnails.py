@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from party.models import Entry
+from party.thumbnails import process_thumbnail
+
+
+class Command(BaseCommand):
+    help = "Renders the missing thumbnail renditions of entries, e.g. for thumbnails uploaded before renditions existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Check every thumbnail, not only the ones without renditions")
+
+    def handle(self, *args, **options):
+        entries = Entry.objects.exclude(thumbnail='')
+        if not options['all']:
+            entries = entries.filter(thumbnail_hash='')
+
+        count = 0
+        for entry_pk in entries.values_list('pk', flat=True):
+            process_thumbnail(entry_pk)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} thumbnails"))
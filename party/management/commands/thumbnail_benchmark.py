@@ -0,0 +1,116 @@
+import argparse
+import json
+import math
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from party.thumbnails import RENDITIONS, crop_box, render_renditions
+
+
+def rss_mb(field):
+    """VmRSS (current) or VmHWM (peak) of this process, Linux only"""
+    for line in Path('/proc/self/status').read_text().splitlines():
+        if line.startswith(f'{field}:'):
+            return int(line.split()[1]) / 1024
+    raise CommandError(f"{field} is not available")
+
+
+def reset_peak_rss():
+    # Resets VmHWM to the current RSS so that the start-up of Django isn't counted
+    Path('/proc/self/clear_refs').write_text('5')
+
+
+def full_decode(path):
+    """How thumbnails used to be processed: the whole image decoded at full resolution"""
+    with Image.open(path) as img:
+        img = img.crop(crop_box(img.size, 16 / 9))
+        img = img.resize((1280, 720))
+        img.convert('RGB').save(Path(path).with_suffix('.out.jpg'))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the peak memory used to process thumbnails of different sizes and formats, "
+        "each in a fresh process, with full and with reduced-resolution decoding"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, nargs='+', default=[2, 12, 24, 48], help="Image sizes to test")
+        parser.add_argument('--formats', nargs='+', default=['JPEG', 'PNG', 'WEBP', 'GIF'], help="Image formats to test")
+        # Internal: processes one image in the subprocess that is measured
+        parser.add_argument('--measure', help=argparse.SUPPRESS)
+        parser.add_argument('--full-decode', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['measure']:
+            self.measure(options['measure'], full=options['full_decode'])
+            return
+
+        self.stdout.write(f"Pixel budget: {settings.THUMBNAIL_MAX_PIXELS / 1_000_000:g} megapixels")
+        columns = ['image', 'file_mb', 'full_decode_mb', 'bounded_mb', 'bounded_s']
+        self.stdout.write(''.join(f'{column:>18}' for column in columns))
+
+        with tempfile.TemporaryDirectory(prefix='pms-thumbnail-benchmark-') as tmp_dir:
+            for megapixels in options['megapixels']:
+                for image_format in options['formats']:
+                    path = self.create_image(Path(tmp_dir), megapixels, image_format)
+                    full = self.run_measurement(path, full_decode=True)
+                    bounded = self.run_measurement(path)
+                    row = [
+                        f'{megapixels:g} MP {image_format}',
+                        f'{path.stat().st_size / 1024 / 1024:.1f}',
+                        f"{full['peak_mb']:.1f}",
+                        f"{bounded['peak_mb']:.1f}" if bounded['status'] == 'ok' else bounded['status'],
+                        f"{bounded['seconds']:.2f}",
+                    ]
+                    self.stdout.write(''.join(f'{value:>18}' for value in row))
+                    path.unlink()
+
+    @staticmethod
+    def create_image(tmp_dir, megapixels, image_format):
+        # 4:3 like a camera photo
+        width = round(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+        height = round(width * 3 / 4)
+        gradient = Image.linear_gradient('L').resize((width, height))
+        img = Image.merge('RGB', [gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient])
+        path = tmp_dir / f'{megapixels:g}mp.{image_format.lower()}'
+        img.save(path, image_format)
+        return path
+
+    @staticmethod
+    def run_measurement(path, full_decode=False):
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'thumbnail_benchmark', '--measure', str(path)]
+        if full_decode:
+            command.append('--full-decode')
+        result = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True)
+        return json.loads(result.stdout)
+
+    def measure(self, path, full):
+        reset_peak_rss()
+        baseline = rss_mb('VmRSS')
+        start = time.perf_counter()
+        status = 'ok'
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            try:
+                if full:
+                    full_decode(path)
+                else:
+                    renditions = [(name, size, ext) for name, (size, formats) in RENDITIONS.items() for ext in formats]
+                    render_renditions(path, 'benchmark', renditions)
+            except ValidationError:
+                status = 'rejected'
+        self.stdout.write(json.dumps({
+            'status': status,
+            'peak_mb': rss_mb('VmHWM') - baseline,
+            'seconds': time.perf_counter() - start,
+        }))
@@ -0,0 +1,33 @@
+import re
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from party import checks
+
+
+HTMX_URL = 'https://unpkg.com/htmx.org@{version}/dist/htmx.min.js'
+
+
+class Command(BaseCommand):
+    help = "Downloads htmx of the version pinned in HTMX_VERSION into static/vendor"
+
+    def handle(self, *args, **options):
+        version = settings.HTMX_VERSION
+        current = checks.vendored_htmx_version()
+        if current == version:
+            self.stdout.write(f"htmx {version} is vendored already")
+            return
+
+        try:
+            with urllib.request.urlopen(HTMX_URL.format(version=version), timeout=30) as response:
+                content = response.read()
+        except OSError as error:
+            raise CommandError(f"Downloading htmx {version} failed: {error}")
+        match = re.search(rb'version:\s*"([\d.]+)"', content)
+        if match is None or match[1].decode() != version:
+            raise CommandError(f"The downloaded file isn't htmx {version}")
+
+        checks.HTMX_PATH.write_bytes(content)
+        self.stdout.write(self.style.SUCCESS(f"Replaced htmx {current} with {version}"))
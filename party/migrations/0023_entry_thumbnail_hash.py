@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('party', '0022_alter_entry_sub_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='thumbnail_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the thumbnail the renditions were rendered from', max_length=64),
+        ),
+    ]
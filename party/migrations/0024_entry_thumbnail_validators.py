@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:23
+
+import party.thumbnails
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('party', '0023_entry_thumbnail_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='entry',
+            name='thumbnail',
+            field=models.ImageField(blank=True, help_text='Will be used as the thumbnail for the Youtube upload after the event', upload_to='thumbnails/', validators=[party.thumbnails.validate_thumbnail_size]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('party', '0025_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='manifest',
+            field=models.JSONField(blank=True, editable=False, help_text='Contents and problems of the file, see party.inspection', null=True),
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='sub_file_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the file the manifest was made from', max_length=64),
+        ),
+    ]
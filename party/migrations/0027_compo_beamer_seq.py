@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('party', '0026_entry_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compo',
+            name='beamer_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
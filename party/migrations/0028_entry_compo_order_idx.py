@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('party', '0027_compo_beamer_seq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['compo', 'order'], name='entry_compo_order_idx'),
+        ),
+    ]
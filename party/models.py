@@ -1,11 +1,16 @@
+import math
+import uuid
+
 from django.db import models
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.core.validators import FileExtensionValidator
 from django.utils.text import slugify
 from django.utils import timezone
 
-from PIL import Image
+from party.inspection import manifest_problems
+from party.thumbnails import rendition_urls, validate_thumbnail_size
 
 
 class Party(models.Model):
@@ -27,11 +32,38 @@ class Party(models.Model):
     def clean(self):
         if self.is_active:
             # There can only be one Party active at once
+            # Checked in the database, not in the cache, which may be behind
             other_active = Party.objects.filter(is_active=True).exclude(pk=self.pk)
             if other_active.exists():
                 raise ValidationError('Only one party can be set active at the same time')
 
 
+ACTIVE_PARTY_CACHE_KEY = 'active-party'
+ACTIVE_PARTY_VERSION_KEY = 'active-party-version'
+# Seconds, bounds how long a write that doesn't invalidate the cache goes unnoticed
+ACTIVE_PARTY_CACHE_TIMEOUT = 300
+
+
+def get_active_party():
+    """
+    Returns the active party with its compos prefetched, or None.
+    Cached for all worker processes under a version that changes whenever a party or
+    a compo is written, so a copy read before a change is never cached as current.
+    """
+    version = cache.get_or_set(ACTIVE_PARTY_VERSION_KEY, uuid.uuid4().hex, None)
+    key = f'{ACTIVE_PARTY_CACHE_KEY}-{version}'
+    party = cache.get(key)
+    if party is None:
+        party = Party.objects.filter(is_active=True).prefetch_related('compo_set').first()
+        # False is cached when there is no active party
+        cache.set(key, party or False, ACTIVE_PARTY_CACHE_TIMEOUT)
+    return party or None
+
+
+def invalidate_active_party():
+    cache.set(ACTIVE_PARTY_VERSION_KEY, uuid.uuid4().hex, None)
+
+
 class CompoVotingStatus(models.TextChoices):
     UPCOMING = 'U', 'Voting is not yet open.'
     LIVE = 'L', 'Voting is live.'
@@ -46,6 +78,8 @@ class Compo(models.Model):
     metadata_deadline = models.DateTimeField()
     voting_status = models.CharField(max_length=1, choices=CompoVotingStatus, default=CompoVotingStatus.UPCOMING)
     current_entry_pos = models.PositiveIntegerField(default=0)
+    # Sequence number of the last slide change sent by the beamer
+    beamer_seq = models.PositiveBigIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ['title', 'party']
@@ -68,6 +102,14 @@ class Compo(models.Model):
     def can_edit_metadata(self):
         return timezone.now() <= self.metadata_deadline
 
+    def check_deadlines(self, file_changed):
+        """Raises ValidationError if entries can't be edited, or their files can't be changed, anymore"""
+        if file_changed and not self.open_for_submissions:
+            raise ValidationError("The deadline for submitting a file has passed. You can still edit the other information of your entry. If your issue is critical, please contact the organizers")
+
+        if not self.can_edit_metadata:
+            raise ValidationError("The deadline for the compo has passed, you can't edit or submit a new entry. If your issue is critical, please contact the organizers")
+
     def __str__(self):
         return f"{self.party} - {self.title}"
 
@@ -78,10 +120,21 @@ class PlatformChoices(models.TextChoices):
     WINDOWS = 'WIN', 'Windows (Proton)'
     OTHER = 'OTH', 'Other (specify below)'
 
+
+# Kind of entry point the submitted file needs per platform, see party.inspection
+PLATFORM_ENTRY_POINTS = {
+    PlatformChoices.WEB: 'index_html',
+    PlatformChoices.LINUX: 'linux',
+    PlatformChoices.WINDOWS: 'windows',
+}
+
 class Entry(models.Model):
     title = models.CharField(max_length=32, help_text="e.g. Färjan")
     sub_file = models.FileField(upload_to="entries/", blank=True, validators=[FileExtensionValidator(['zip'])])
-    thumbnail = models.ImageField(upload_to="thumbnails/", blank=True, help_text="Will be used as the thumbnail for the Youtube upload after the event")
+    sub_file_hash = models.CharField(max_length=64, blank=True, editable=False, help_text="Hash of the file the manifest was made from")
+    manifest = models.JSONField(null=True, blank=True, editable=False, help_text="Contents and problems of the file, see party.inspection")
+    thumbnail = models.ImageField(upload_to="thumbnails/", blank=True, validators=[validate_thumbnail_size], help_text="Will be used as the thumbnail for the Youtube upload after the event")
+    thumbnail_hash = models.CharField(max_length=64, blank=True, editable=False, help_text="Hash of the thumbnail the renditions were rendered from")
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, blank=True, null=True)
     team = models.CharField(max_length=32, help_text="e.g. demogroup")
     team_member_count = models.PositiveIntegerField(default=1, help_text="How many of you are there in your team?")
@@ -99,19 +152,10 @@ class Entry(models.Model):
     class Meta:
         verbose_name_plural = 'entries'
         ordering = ["order"]
-    
-    @staticmethod
-    def calculate_positions():
-        entries = Entry.objects.annotate(total_points=Sum('votes__points')).order_by('-total_points')
-        positions = []
-        current_position = 1
-
-        for index, entry in enumerate(entries):
-            if index > 0 and entry.total_points < entries[index - 1].total_points:
-                current_position = index + 1
-            positions.append((current_position, entry.total_points, entry))
-
-        return positions
+        indexes = [
+            # Entries of a compo in their order, without sorting
+            models.Index(fields=['compo', 'order'], name='entry_compo_order_idx'),
+        ]
     
     @property
     def entry_filename(self):
@@ -123,40 +167,69 @@ class Entry(models.Model):
 
     @property
     def entry_total_points(self):
-        votes = self.votes.all().aggregate(total=models.Sum('points'))['total'] or 0
-        return votes
+        try:
+            return self.score.total
+        except ObjectDoesNotExist:
+            return 0
 
     def __str__(self):
         return f"{self.title} by {self.team} - {self.compo}"
 
+    # File fields and the fields with the hash of the file they were processed from
+    hashed_files = {'thumbnail': 'thumbnail_hash', 'sub_file': 'sub_file_hash'}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_files = {field: instance.__dict__.get(field, models.DEFERRED) for field in cls.hashed_files}
+        return instance
+
     def save(self, *args, **kwargs):
+        # New files are processed in the background after they are saved, see party.signals
+        loaded_files = getattr(self, '_loaded_files', {})
+        # Hashes of the replaced files, whose leftovers are removed by party.signals
+        self._replaced_hashes = {}
+        for field, hash_field in self.hashed_files.items():
+            loaded = loaded_files.get(field)
+            if loaded is not models.DEFERRED and getattr(self, field).name != loaded:
+                self._replaced_hashes[hash_field] = getattr(self, hash_field)
+                setattr(self, hash_field, '')
         super().save(*args, **kwargs)
+        self._loaded_files = {field: getattr(self, field).name for field in self.hashed_files}
 
-        if self.thumbnail:
-            with Image.open(self.thumbnail.path) as img:
-                size = (1280, 720)
-                img = self.crop_to_16_by_9(img)
-                img = img.resize(size)
-                img.save(self.thumbnail.path)
+    @property
+    def thumbnail_renditions(self):
+        """{name: {ext: url}} of the thumbnail renditions, empty until they have been rendered"""
+        if not self.thumbnail or not self.thumbnail_hash:
+            return {}
+        return rendition_urls(self.thumbnail_hash)
 
-        super().save(*args, **kwargs)
-    
-    def crop_to_16_by_9(self, img):
-        img_width, img_height = img.size
-        aspect_ratio = 16 / 9
-
-        if img_width / img_height > aspect_ratio:
-            # Image is wider than the aspect ratio, crop width
-            new_width = int(img_height * aspect_ratio)
-            new_height = img_height
-        else:
-            # Image is taller than the aspect ratio, crop height
-            new_width = img_width
-            new_height = int(img_width / aspect_ratio)
-
-        left = (img_width - new_width) / 2
-        top = (img_height - new_height) / 2
-        right = (img_width + new_width) / 2
-        bottom = (img_height + new_height) / 2
-
-        return img.crop((left, top, right, bottom))
\ No newline at end of file
+    @property
+    def submission_problems(self):
+        """Problems found in the submitted file, None until it has been inspected"""
+        if not self.sub_file or not self.sub_file_hash or self.manifest is None:
+            return None
+        return manifest_problems(self.manifest, PLATFORM_ENTRY_POINTS.get(self.platform))
+
+
+class Upload(models.Model):
+    """A chunked upload of an entry file, staged on disk until an entry is saved with it"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    compo = models.ForeignKey(Compo, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.filename} by {self.owner}"
+
+    @property
+    def chunk_count(self):
+        return math.ceil(self.size / self.chunk_size)
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
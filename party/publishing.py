@@ -0,0 +1,98 @@
+"""
+Publishing data of the entries of a party, for uploading the entries to YouTube
+and scene.org after the party.
+
+The data is computed from the results in a single query and exported as JSON or
+CSV for bulk upload tools. The YouTube description page of a compo renders the
+same data, so what is copied by hand matches what is uploaded in bulk.
+"""
+import csv
+import io
+from dataclasses import dataclass, fields
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import ordinal
+
+from party.results import compo_results, party_results
+from party.thumbnails import rendition_name
+
+
+@dataclass(frozen=True)
+class PublishedEntry:
+    party: str
+    compo: str
+    rank: int
+    points: int
+    title: str
+    team: str
+    youtube_title: str
+    description: str
+    scene_org_path: str
+    thumbnail_path: str
+
+    @classmethod
+    def from_placement(cls, party_title, placement):
+        rank, points, entry = placement
+        compo = entry.compo.title
+        scene_org_path = f'{settings.SCENE_ORG_PARTY_DIR}/{compo.lower()}/{entry.scene_org_filename}'
+        description = (
+            f"{ordinal(rank)} place in {compo} compo with {points} points\n\n"
+            f"Download the original demo: https://files.scene.org/view/{scene_org_path}\n\n"
+            f"More info about Graffathon: https://graffathon.fi"
+        )
+        return cls(
+            party=party_title,
+            compo=compo,
+            rank=rank,
+            points=points,
+            title=entry.title,
+            team=entry.team,
+            youtube_title=f"{entry.title} by {entry.team} – {party_title} – {compo}",
+            description=description,
+            scene_org_path=scene_org_path,
+            thumbnail_path=thumbnail_path(entry),
+        )
+
+
+# Exported columns, in order
+COLUMNS = [field.name for field in fields(PublishedEntry)]
+
+
+def thumbnail_path(entry):
+    """Path of the YouTube-sized thumbnail under MEDIA_ROOT, or of the original until it has been rendered"""
+    if entry.thumbnail and entry.thumbnail_hash:
+        return rendition_name(entry.thumbnail_hash, 'youtube', 'jpg')
+    return entry.thumbnail.name or ''
+
+
+def party_publishing(party):
+    """Published entries of every compo of the party, in one query"""
+    results = party_results(party)
+    return [
+        PublishedEntry.from_placement(party.title, placement)
+        for compo in results.compos for placement in compo
+    ]
+
+
+def compo_publishing(compo):
+    """Published entries of the compo with the entries, in one query if compo.party is loaded"""
+    return [
+        (PublishedEntry.from_placement(compo.party.title, placement), placement.entry)
+        for placement in compo_results(compo)
+    ]
+
+
+def as_json(party, entries):
+    return {
+        'party': party.title,
+        'entries': [{column: getattr(entry, column) for column in COLUMNS} for entry in entries],
+    }
+
+
+def as_csv(entries):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS)
+    for entry in entries:
+        writer.writerow([getattr(entry, column) for column in COLUMNS])
+    return output.getvalue()
@@ -0,0 +1,84 @@
+"""
+Compo results of a party.
+
+All entries of a party are loaded with their score tallies in one query and ranked
+per compo with competition ranking: tied entries share a place and the next place
+is skipped ("1224"). Entries without votes have 0 points and are ranked as well.
+"""
+from dataclasses import dataclass
+from itertools import groupby
+from typing import NamedTuple
+
+from django.db.models.functions import Coalesce
+
+from party.models import Compo, Entry
+
+
+class Placement(NamedTuple):
+    rank: int
+    points: int
+    entry: Entry
+
+
+@dataclass(frozen=True)
+class CompoResults:
+    compo: Compo
+    placements: tuple[Placement, ...]
+
+    def __iter__(self):
+        return iter(self.placements)
+
+
+@dataclass(frozen=True)
+class PartyResults:
+    party_id: int
+    compos: tuple[CompoResults, ...]
+
+    def for_compo(self, compo_pk):
+        for results in self.compos:
+            if results.compo.pk == compo_pk:
+                return results
+        return None
+
+    def placement(self, entry_pk):
+        for results in self.compos:
+            for placement in results.placements:
+                if placement.entry.pk == entry_pk:
+                    return placement
+        return None
+
+
+def rank(entries):
+    """Returns the placements of the entries, which must have a total_points attribute"""
+    entries = sorted(entries, key=lambda entry: (-entry.total_points, entry.order, entry.pk))
+    placements = []
+    for index, entry in enumerate(entries):
+        if index == 0 or entry.total_points < entries[index - 1].total_points:
+            current_rank = index + 1
+        placements.append(Placement(current_rank, entry.total_points, entry))
+    return tuple(placements)
+
+
+def _scored_entries(**filters):
+    return (
+        Entry.objects
+        .filter(**filters)
+        .select_related('compo')
+        .annotate(total_points=Coalesce('score__total', 0))
+        .order_by('compo__title', 'compo_id')
+    )
+
+
+def party_results(party):
+    """Computes the results of every compo of the party in one query"""
+    party_id = getattr(party, 'pk', party)
+    compos = []
+    for _, entries in groupby(_scored_entries(compo__party_id=party_id), key=lambda entry: entry.compo_id):
+        entries = list(entries)
+        compos.append(CompoResults(entries[0].compo, rank(entries)))
+    return PartyResults(party_id, tuple(compos))
+
+
+def compo_results(compo):
+    """Computes the results of a single compo in one query"""
+    return CompoResults(compo, rank(_scored_entries(compo=compo)))
@@ -0,0 +1,64 @@
+import shutil
+
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from party.exports import build_compo_archive
+from party.models import Party, Compo, Entry, Upload, invalidate_active_party
+from party.inspection import inspect_entry
+from party.thumbnails import process_thumbnail, remove_unused_renditions
+from party.uploads import upload_dir
+from tasks.queue import enqueue
+
+
+@receiver(post_save, sender=Party)
+@receiver(post_delete, sender=Party)
+@receiver(post_save, sender=Compo)
+@receiver(post_delete, sender=Compo)
+def clear_active_party(sender, **kwargs):
+    invalidate_active_party()
+    # Again after commit, in case another process cached the old state in between
+    transaction.on_commit(invalidate_active_party)
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def rebuild_compo_archive(sender, instance, **kwargs):
+    enqueue(build_compo_archive, instance.compo_id, key=f'export-{instance.compo_id}')
+
+
+@receiver(post_save, sender=Entry)
+def render_thumbnail(sender, instance, **kwargs):
+    if instance.thumbnail and not instance.thumbnail_hash:
+        enqueue(process_thumbnail, instance.pk, key=f'thumbnail-{instance.pk}')
+
+
+@receiver(post_save, sender=Entry)
+def remove_replaced_renditions(sender, instance, **kwargs):
+    content_hash = getattr(instance, '_replaced_hashes', {}).get('thumbnail_hash')
+    if content_hash:
+        enqueue(remove_unused_renditions, content_hash, key=f'renditions-{content_hash}')
+
+
+@receiver(post_delete, sender=Entry)
+def remove_renditions(sender, instance, **kwargs):
+    if instance.thumbnail_hash:
+        enqueue(remove_unused_renditions, instance.thumbnail_hash, key=f'renditions-{instance.thumbnail_hash}')
+
+
+@receiver(post_save, sender=Entry)
+def inspect_submission(sender, instance, **kwargs):
+    if instance.sub_file and not instance.sub_file_hash:
+        enqueue(inspect_entry, instance.pk, key=f'inspect-{instance.pk}')
+
+
+@receiver(post_delete, sender=Compo)
+def remove_compo_archive(sender, instance, **kwargs):
+    enqueue(build_compo_archive, instance.pk, key=f'export-{instance.pk}')
+
+
+@receiver(post_delete, sender=Upload)
+def remove_upload(sender, instance, **kwargs):
+    directory = upload_dir(instance)
+    transaction.on_commit(lambda: shutil.rmtree(directory, ignore_errors=True))
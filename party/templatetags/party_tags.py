@@ -1,8 +1,9 @@
 from django import template
-from party.models import Party
+from party.models import get_active_party
 
 register = template.Library()
 
 @register.simple_tag()
 def get_active_party_title():
-    return Party.objects.get(is_active=True).title 
\ No newline at end of file
+    party = get_active_party()
+    return party.title if party else ''
@@ -0,0 +1,26 @@
+"""Test helpers shared by the tests of the apps"""
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from party.models import Party, Compo, Entry
+
+
+def create_compo(party=None, title='Demo', entry_count=0, **fields):
+    """Creates a compo open for submissions, in the party 'Test party' unless one is given, with numbered entries"""
+    if party is None:
+        party, _ = Party.objects.get_or_create(title='Test party')
+    now = timezone.now()
+    # Published like a committed compo, replacing the live state of an earlier test's compo with the same pk
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        compo = Compo.objects.create(
+            title=title,
+            party=party,
+            submission_deadline=now + timedelta(days=1),
+            metadata_deadline=now + timedelta(days=1),
+            **fields
+        )
+    for i in range(entry_count):
+        Entry(title=f'{title} {i}', team='Team', compo=compo, order=i + 1, platform='WEB').save()
+    return compo
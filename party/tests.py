@@ -1,3 +1,690 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import math
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from PIL import ExifTags, Image
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command, CommandError
+from django.db.models import QuerySet
+from django.http import FileResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from party.models import (
+    Party, Entry, Upload, PlatformChoices, ACTIVE_PARTY_CACHE_KEY, ACTIVE_PARTY_VERSION_KEY,
+    get_active_party, invalidate_active_party,
+)
+from party import checks, publishing
+from party.results import party_results, compo_results
+from party.testing import create_compo
+from party.thumbnails import RENDITIONS, PIL_FORMATS, rendition_dir, rendition_name
+from party.uploads import attach_upload, purge_uploads
+from vote.models import VoteKey, Vote
+
+
+def vote(entry, points):
+    for i, entry_points in enumerate(points):
+        votekey, _ = VoteKey.objects.get_or_create(party=entry.compo.party, key=f'key-{i}')
+        Vote.objects.create(entry=entry, votekey=votekey, points=entry_points)
+
+
+class ResultsTests(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(title='Test party')
+        self.demo = create_compo(self.party, 'Demo', 4)
+        self.music = create_compo(self.party, 'Music', 2)
+        first, second, third, fourth = self.demo.entries.all()
+        vote(first, [3, 3])
+        vote(second, [5, 4])
+        vote(third, [5, 1])
+        vote(self.music.entries.first(), [1])
+
+    def test_competition_ranking_with_ties(self):
+        results = compo_results(self.demo)
+        self.assertEqual(
+            [(rank, points, entry.title) for rank, points, entry in results],
+            [(1, 9, 'Demo 1'), (2, 6, 'Demo 0'), (2, 6, 'Demo 2'), (4, 0, 'Demo 3')],
+        )
+
+    def test_party_results_in_one_query(self):
+        last_demo = self.demo.entries.last()
+        with self.assertNumQueries(1):
+            results = party_results(self.party)
+            music = results.for_compo(self.music.pk)
+            self.assertEqual([(rank, points) for rank, points, _ in music], [(1, 1), (2, 0)])
+            self.assertEqual(results.placement(last_demo.pk).rank, 4)
+
+    def test_youtube_page_and_admin_show_ranks(self):
+        User.objects.create_superuser('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+        response = self.client.get(reverse('compo-youtube-desc', args=[self.demo.pk]))
+        self.assertContains(response, '2nd place in Demo compo with 6 points', count=2)
+
+        response = self.client.get(reverse('admin:party_entry_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<td class="field-rank">4</td>', html=True)
+
+    def test_admin_sorts_by_points(self):
+        User.objects.create_superuser('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+        # The third column, points, descending
+        response = self.client.get(reverse('admin:party_entry_changelist'), {'o': '-3'})
+        self.assertEqual([entry.total_points for entry in response.context['cl'].result_list], [9, 6, 6, 1, 0, 0])
+
+
+def zip_bytes(**files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+@override_settings(SCENE_ORG_PARTY_DIR='parties/2025/test')
+class PublishingTests(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(title='Test party')
+        self.demo = create_compo(self.party, 'Demo', 3)
+        self.music = create_compo(self.party, 'Music', 2)
+        vote(self.demo.entries.last(), [5])
+        admin = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(admin)
+
+    def test_one_query_for_all_entries(self):
+        with self.assertNumQueries(1):
+            entries = publishing.party_publishing(self.party)
+        self.assertEqual(len(entries), 5)
+        first = entries[0]
+        self.assertEqual((first.compo, first.rank, first.points, first.title), ('Demo', 1, 5, 'Demo 2'))
+        self.assertEqual(first.scene_org_path, 'parties/2025/test/demo/demo-2.zip')
+        self.assertIn('1st place in Demo compo with 5 points', first.description)
+
+    def test_json_and_csv(self):
+        response = self.client.get(reverse('party-publishing', args=[self.party.pk]))
+        data = response.json()
+        self.assertEqual(data['party'], 'Test party')
+        self.assertEqual([entry['title'] for entry in data['entries']][:2], ['Demo 2', 'Demo 0'])
+
+        response = self.client.get(reverse('party-publishing', args=[self.party.pk]), {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(response.content.decode())))
+        self.assertEqual(rows[0], publishing.COLUMNS)
+        self.assertEqual(len(rows), 6)
+
+    def test_staff_only(self):
+        self.client.logout()
+        response = self.client.get(reverse('party-publishing', args=[self.party.pk]))
+        self.assertEqual(response.status_code, 302)
+
+    def test_page_matches_export(self):
+        entry = publishing.party_publishing(self.party)[0]
+        response = self.client.get(reverse('compo-youtube-desc', args=[self.demo.pk]))
+        self.assertContains(response, entry.youtube_title)
+        self.assertContains(response, entry.scene_org_path)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_publishing', 'Test party', '--format', 'csv', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[0], ','.join(publishing.COLUMNS))
+
+
+class ActivePartyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.party = Party.objects.create(title='Test party')
+        create_compo(self.party, 'Demo', 0)
+
+    def test_active_party_is_cached(self):
+        self.assertEqual(get_active_party(), self.party)
+        with self.assertNumQueries(0):
+            party = get_active_party()
+            self.assertEqual([compo.title for compo in party.compo_set.all()], ['Demo'])
+
+    def test_party_page_uses_cache(self):
+        self.client.get(reverse('party'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('party'))
+        self.assertContains(response, 'Demo')
+
+    def test_invalidated_on_change(self):
+        get_active_party()
+        create_compo(self.party, 'Music', 0)
+        self.assertEqual(len(get_active_party().compo_set.all()), 2)
+
+        self.party.is_active = False
+        self.party.save()
+        self.assertIsNone(get_active_party())
+        self.assertEqual(self.client.get(reverse('party')).status_code, 404)
+
+    def test_only_one_active_party(self):
+        with self.assertRaises(ValidationError):
+            Party.objects.create(title='Other party')
+        self.party.delete()
+        Party.objects.create(title='Other party')
+
+    def test_read_before_a_change_is_not_cached_as_current(self):
+        first = QuerySet.first
+
+        def first_then_change(queryset):
+            party = first(queryset)
+            # Another process changes a compo after this one read the database
+            invalidate_active_party()
+            return party
+
+        with mock.patch.object(QuerySet, 'first', first_then_change):
+            get_active_party()
+        with self.assertNumQueries(2):
+            get_active_party()
+
+    def test_only_one_active_party_with_stale_cache(self):
+        cache.set(f'{ACTIVE_PARTY_CACHE_KEY}-{cache.get(ACTIVE_PARTY_VERSION_KEY)}', False)
+        with self.assertRaises(ValidationError):
+            Party(title='Other party').clean()
+
+
+class ExportEntriesTests(TestCase):
+    def setUp(self):
+        party = Party.objects.create(title='Test party')
+        self.compo = create_compo(party, 'Demo', 3)
+        for entry in self.compo.entries.all():
+            entry.sub_file = SimpleUploadedFile(f'{entry.order}.zip', zip_bytes(**{'index.html': 'x' * 1000 * entry.order}))
+            entry.save()
+        User.objects.create_superuser('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+    def assert_stored_archive(self, response, names):
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        content = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(content))
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(sorted(archive.namelist()), sorted(names))
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist()))
+
+    def test_export_selected_entries_action(self):
+        entries = list(self.compo.entries.all()[:2])
+        response = self.client.post(reverse('admin:party_entry_changelist'), {
+            'action': 'export_entries',
+            '_selected_action': [entry.pk for entry in entries],
+        })
+        self.assert_stored_archive(response, [entry.sub_file.name.split('/')[-1] for entry in entries])
+
+    def test_export_compo_entries(self):
+        response = self.client.get(reverse('admin:export_entries', args=[self.compo.pk]))
+        self.assert_stored_archive(response, [f"{entry.order} {entry.sub_file.name.split('/')[-1]}" for entry in self.compo.entries.all()])
+
+
+@override_settings(TASKS_EAGER=True)
+class CompoArchiveTests(TestCase):
+    def setUp(self):
+        party = Party.objects.create(title='Test party')
+        self.compo = create_compo(party, 'Demo', 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            for entry in self.compo.entries.all():
+                entry.sub_file = SimpleUploadedFile(f'{entry.order}.zip', zip_bytes(**{'demo.exe': 'x' * 5000}))
+                entry.save()
+        User.objects.create_superuser('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+        self.url = reverse('admin:export_entries', args=[self.compo.pk])
+
+    def test_prebuilt_archive_is_served(self):
+        response = self.client.get(self.url)
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        content = b''.join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+
+    def test_range_requests(self):
+        full = b''.join(self.client.get(self.url).streaming_content)
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-', 'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-{len(full) - 1}/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[100:])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(response.streaming_content), full[-10:])
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(full)}-'})
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-', 'If-Range': '"outdated"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_removed_archive_is_streamed(self):
+        for path in Path(settings.EXPORTS_DIR).glob(f'compo-{self.compo.pk}-*.zip'):
+            path.unlink()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(self.url)
+        self.assertNotIsInstance(response, FileResponse)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+        self.assertIsInstance(self.client.get(self.url), FileResponse)
+
+    def test_missing_file_is_left_out(self):
+        missing, kept = self.compo.entries.all()
+        os.remove(missing.sub_file.path)
+        with self.assertLogs('party.exports', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(self.url)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), [f'2 {os.path.basename(kept.sub_file.name)}'])
+        with self.assertLogs('party.exports', 'WARNING'):
+            self.assertIsInstance(self.client.get(self.url), FileResponse)
+
+    def test_archive_is_rebuilt_when_an_entry_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        entry = self.compo.entries.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.sub_file = SimpleUploadedFile('new.zip', zip_bytes(**{'index.html': 'new'}))
+            entry.save()
+        response = self.client.get(self.url)
+        self.assertIsInstance(response, FileResponse)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(list(Path(settings.EXPORTS_DIR).glob(f'compo-{self.compo.pk}-*.zip'))), 1)
+
+
+def image_bytes(size, color='red', format='PNG', **params):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format, **params)
+    return buffer.getvalue()
+
+
+@override_settings(TASKS_EAGER=True)
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        party = Party.objects.create(title='Test party')
+        self.entry = create_compo(party, 'Demo', 1).entries.get()
+        self.original = image_bytes((2000, 1500))
+
+    def upload(self, content, name='thumb.png'):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.thumbnail = SimpleUploadedFile(name, content)
+            self.entry.save()
+        self.entry.refresh_from_db()
+
+    def test_renditions_are_rendered_and_original_is_kept(self):
+        self.upload(self.original)
+        self.assertEqual(self.entry.thumbnail_hash, hashlib.sha256(self.original).hexdigest())
+        with open(self.entry.thumbnail.path, 'rb') as file:
+            self.assertEqual(file.read(), self.original)
+
+        for name, ((width, height), formats) in RENDITIONS.items():
+            for ext in formats:
+                path = Path(settings.MEDIA_ROOT) / rendition_name(self.entry.thumbnail_hash, name, ext)
+                with Image.open(path) as img:
+                    self.assertEqual(img.size, (width, height))
+                    self.assertEqual(img.format, PIL_FORMATS[ext])
+        self.assertTrue(self.entry.thumbnail_renditions['youtube']['jpg'].endswith('/youtube.jpg'))
+
+    def test_renditions_are_rendered_only_when_the_content_changes(self):
+        self.upload(self.original)
+        with mock.patch('party.thumbnails.render_renditions') as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.entry.contact_phone = '+358401234567'
+                self.entry.save()
+            # The same image uploaded again under another name
+            self.upload(self.original, 'again.png')
+            render.assert_not_called()
+
+            self.upload(image_bytes((1920, 1080), 'blue'))
+            render.assert_called_once()
+
+    def test_replaced_and_deleted_renditions_are_removed(self):
+        self.upload(self.original)
+        original_dir = Path(settings.MEDIA_ROOT) / rendition_dir(self.entry.thumbnail_hash)
+        self.upload(image_bytes((1920, 1080), 'blue'))
+        replaced_dir = Path(settings.MEDIA_ROOT) / rendition_dir(self.entry.thumbnail_hash)
+        self.assertFalse(original_dir.exists())
+        self.assertTrue(replaced_dir.exists())
+
+        # Kept while another entry has the same image
+        other = Entry.objects.create(title='Other', team='Team', compo=self.entry.compo, order=2, platform='WEB')
+        with self.captureOnCommitCallbacks(execute=True):
+            other.thumbnail = SimpleUploadedFile('other.png', image_bytes((1920, 1080), 'blue'))
+            other.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.delete()
+        self.assertTrue(replaced_dir.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            Entry.objects.get(pk=other.pk).delete()
+        self.assertFalse(replaced_dir.exists())
+
+    def test_rejected_thumbnail_is_logged(self):
+        self.upload(self.original)
+        with override_settings(THUMBNAIL_MAX_PIXELS=1_000_000), self.assertLogs('party.thumbnails', 'ERROR') as logs:
+            self.upload(image_bytes((2000, 1500), 'blue'))
+        self.assertIn('rejected', logs.output[0])
+        self.assertEqual(self.entry.thumbnail_hash, '')
+        self.assertEqual(self.entry.thumbnail_renditions, {})
+
+    def test_youtube_page_shows_preview(self):
+        self.upload(self.original)
+        User.objects.create_superuser('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+        response = self.client.get(reverse('compo-youtube-desc', args=[self.entry.compo.pk]))
+        self.assertContains(response, self.entry.thumbnail_renditions['preview']['webp'])
+        self.assertContains(response, self.entry.thumbnail_renditions['youtube']['jpg'])
+
+    @override_settings(THUMBNAIL_MAX_PIXELS=4_000_000)
+    def test_pixel_budget(self):
+        # JPEGs are decoded at reduced resolution, 1/2 scale here
+        self.entry.thumbnail = SimpleUploadedFile('thumb.jpg', image_bytes((4000, 3000), format='JPEG'))
+        self.entry.full_clean()
+
+        self.entry.thumbnail = SimpleUploadedFile('thumb.png', image_bytes((4000, 3000)))
+        with self.assertRaisesMessage(ValidationError, 'too large'):
+            self.entry.full_clean()
+
+        # Decoding WebP takes several full-size buffers
+        self.entry.thumbnail = SimpleUploadedFile('thumb.png', image_bytes((2000, 1500)))
+        self.entry.full_clean()
+        self.entry.thumbnail = SimpleUploadedFile('thumb.webp', image_bytes((2000, 1500), format='WEBP'))
+        with self.assertRaisesMessage(ValidationError, 'at most 1.3 megapixels'):
+            self.entry.full_clean()
+
+    def test_reduced_resolution_decoding(self):
+        self.upload(image_bytes((4000, 3000), format='JPEG'), 'thumb.jpg')
+        path = Path(settings.MEDIA_ROOT) / rendition_name(self.entry.thumbnail_hash, 'youtube', 'jpg')
+        with Image.open(path) as img:
+            self.assertEqual(img.size, (1280, 720))
+
+    def test_exif_orientation(self):
+        # Stored sideways with the left half red, displayed rotated so that red is on top
+        img = Image.new('RGB', (1600, 900), 'blue')
+        img.paste('red', (0, 0, 800, 900))
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', exif=exif)
+
+        self.upload(buffer.getvalue(), 'thumb.jpg')
+        path = Path(settings.MEDIA_ROOT) / rendition_name(self.entry.thumbnail_hash, 'youtube', 'jpg')
+        with Image.open(path) as img:
+            self.assertEqual(img.size, (1280, 720))
+            red, green, blue = img.getpixel((640, 100))
+            self.assertGreater(red, blue)
+            red, green, blue = img.getpixel((640, 620))
+            self.assertGreater(blue, red)
+
+
+def upload_checksum(content, chunk_size):
+    chunks = [content[start:start + chunk_size] for start in range(0, len(content), chunk_size)]
+    return hashlib.sha256(b''.join(hashlib.sha256(chunk).digest() for chunk in chunks)).hexdigest()
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=1000)
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        party = Party.objects.create(title='Test party')
+        self.compo = create_compo(party, 'Demo', 0)
+        self.user = User.objects.create_user('author', password='author')
+        self.client.login(username='author', password='author')
+        self.content = zip_bytes(**{'demo.exe': os.urandom(2500)})
+
+    def start(self, content=None, **data):
+        content = content or self.content
+        return self.client.post(reverse('start-upload'), {
+            'compo': self.compo.pk, 'filename': 'demo.zip', 'size': len(content),
+            'sha256': upload_checksum(content, 1000), **data,
+        }, content_type='application/json')
+
+    def send_chunk(self, upload_id, index, chunk_size=1000, sha256=None):
+        chunk = self.content[index * chunk_size:(index + 1) * chunk_size]
+        return self.client.put(
+            reverse('upload-chunk', args=[upload_id, index]), chunk, content_type='application/octet-stream',
+            headers={'X-Chunk-Sha256': sha256 or hashlib.sha256(chunk).hexdigest()},
+        )
+
+    def upload(self):
+        status = self.start().json()
+        for index in range(status['chunk_count']):
+            self.send_chunk(status['id'], index)
+        self.assertEqual(self.client.post(reverse('complete-upload', args=[status['id']])).status_code, 200)
+        return status['id']
+
+    def test_api_is_outside_media_url(self):
+        status = self.start().json()
+        for url in (reverse('start-upload'), reverse('complete-upload', args=[status['id']])):
+            self.assertFalse(url.lstrip('/').startswith(settings.MEDIA_URL), url)
+
+    def entry_data(self, **data):
+        return {'compo': self.compo.pk, 'title': 'Demo', 'team': 'Team', 'team_member_count': 1, 'platform': 'WEB', **data}
+
+    def test_resume_after_interruption(self):
+        status = self.start().json()
+        self.assertEqual(status['chunk_count'], math.ceil(len(self.content) / 1000))
+        self.assertEqual(self.send_chunk(status['id'], 1).status_code, 200)
+        self.assertEqual(self.send_chunk(status['id'], 1, sha256='0' * 64).status_code, 400)
+
+        status = self.client.get(reverse('upload-status', args=[status['id']])).json()
+        self.assertEqual(status['received'], [1])
+        response = self.client.post(reverse('complete-upload', args=[status['id']]))
+        self.assertContains(response, 'chunks are missing', status_code=400)
+
+        for index in range(status['chunk_count']):
+            if index not in status['received']:
+                self.send_chunk(status['id'], index)
+        status = self.client.post(reverse('complete-upload', args=[status['id']])).json()
+        self.assertTrue(status['complete'])
+
+    def test_file_checksum_mismatch(self):
+        status = self.start(sha256='0' * 64).json()
+        for index in range(status['chunk_count']):
+            self.send_chunk(status['id'], index)
+        response = self.client.post(reverse('complete-upload', args=[status['id']]))
+        self.assertContains(response, 'File checksum mismatch', status_code=400)
+        self.assertEqual(self.client.get(reverse('upload-status', args=[status['id']])).json()['received'], [])
+
+    def test_entry_is_saved_with_the_upload(self):
+        upload_id = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('submit-entry', args=[self.compo.pk]), self.entry_data(upload=upload_id))
+        self.assertRedirects(response, reverse('entries'))
+
+        entry = Entry.objects.get(owner=self.user)
+        with entry.sub_file.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(Upload.objects.exists())
+        self.assertFalse((Path(settings.UPLOADS_DIR) / upload_id).exists())
+
+    def test_deadlines_are_checked_when_the_upload_starts(self):
+        self.compo.submission_deadline = timezone.now() - timedelta(minutes=1)
+        self.compo.save()
+        self.assertContains(self.start(), 'deadline for submitting a file has passed', status_code=400)
+
+    def test_upload_started_before_the_deadline_can_be_attached(self):
+        upload_id = self.upload()
+        entry = Entry(title='Demo', team='Team', compo=self.compo, owner=self.user, platform='WEB')
+        entry.save()
+        self.compo.submission_deadline = timezone.now() - timedelta(minutes=1)
+        self.compo.save()
+
+        response = self.client.post(reverse('update-entry', args=[entry.pk]), self.entry_data(upload=upload_id))
+        self.assertRedirects(response, reverse('entries'))
+        entry.refresh_from_db()
+        self.assertTrue(entry.sub_file.name.endswith('.zip'))
+
+    def test_upload_can_be_attached_again_after_a_failed_save(self):
+        upload_id = self.upload()
+        entry = Entry(title='Demo', team='Team', compo=self.compo, owner=self.user, platform='WEB')
+        entry.save()
+        upload = Upload.objects.get(pk=upload_id)
+        media_files = set(Path(settings.MEDIA_ROOT).rglob('*.zip'))
+        with mock.patch.object(Entry, 'save', side_effect=ValidationError("Failed")):
+            with self.assertRaises(ValidationError):
+                attach_upload(upload, entry)
+        self.assertEqual(set(Path(settings.MEDIA_ROOT).rglob('*.zip')), media_files)
+
+        attach_upload(upload, entry)
+        with entry.sub_file.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_abandoned_uploads_are_purged(self):
+        upload_id = self.upload()
+        orphan = Path(settings.UPLOADS_DIR) / 'orphan'
+        orphan.mkdir()
+        purge_uploads()
+        self.assertTrue(Upload.objects.filter(pk=upload_id).exists())
+        self.assertTrue(orphan.exists())
+
+        Upload.objects.filter(pk=upload_id).update(created_at=timezone.now() - timedelta(days=3))
+        os.utime(orphan, (0, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_uploads()
+        self.assertFalse(Upload.objects.exists())
+        self.assertFalse((Path(settings.UPLOADS_DIR) / upload_id).exists())
+        self.assertFalse(orphan.exists())
+
+    def test_uploads_of_other_users_are_not_accessible(self):
+        upload_id = self.upload()
+        User.objects.create_user('other', password='other')
+        self.client.login(username='other', password='other')
+        self.assertEqual(self.client.get(reverse('upload-status', args=[upload_id])).status_code, 404)
+        response = self.client.post(reverse('submit-entry', args=[self.compo.pk]), self.entry_data(upload=upload_id))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Entry.objects.exists())
+
+
+@override_settings(TASKS_EAGER=True)
+class InspectionTests(TestCase):
+    def setUp(self):
+        party = Party.objects.create(title='Test party')
+        self.entry = create_compo(party, 'Demo', 1).entries.get()
+
+    def submit(self, content, name='demo.zip', **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.sub_file = SimpleUploadedFile(name, content)
+            for field, value in fields.items():
+                setattr(self.entry, field, value)
+            self.entry.save()
+        self.entry.refresh_from_db()
+
+    def test_manifest(self):
+        self.submit(zip_bytes(**{'demo/index.html': '<html>', 'demo/main.js': 'x' * 1000}))
+        self.assertEqual(self.entry.sub_file_hash, self.entry.manifest['sha256'])
+        self.assertEqual(self.entry.manifest['file_count'], 2)
+        self.assertEqual(self.entry.manifest['uncompressed_size'], 1006)
+        self.assertEqual(self.entry.manifest['entry_points']['index_html'], ['demo/index.html'])
+        self.assertEqual(self.entry.submission_problems, [])
+
+    def test_missing_entry_point_for_platform(self):
+        self.submit(zip_bytes(**{'demo.exe': 'MZ'}), platform=PlatformChoices.LINUX)
+        self.assertEqual(self.entry.submission_problems, ["No Linux executable found"])
+        self.entry.platform = PlatformChoices.WINDOWS
+        self.assertEqual(self.entry.submission_problems, [])
+
+    def test_corrupted_member(self):
+        content = bytearray(zip_bytes(**{'index.html': 'a' * 1000}))
+        # Flip a byte of the compressed data, after the local header and file name
+        content[40] ^= 0xff
+        self.submit(bytes(content))
+        self.assertEqual(len(self.entry.submission_problems), 1)
+        self.assertIn('index.html is corrupted', self.entry.submission_problems[0])
+
+    def test_not_a_zip(self):
+        self.submit(b'not a zip')
+        self.assertIn('Not a valid zip file', self.entry.submission_problems[0])
+
+    @override_settings(ENTRY_MAX_UNCOMPRESSED_SIZE=1000)
+    def test_limits(self):
+        self.submit(zip_bytes(**{'index.html': 'a' * 2000}))
+        self.assertIn('Too large when extracted', self.entry.submission_problems[0])
+
+    def test_same_content_is_not_inspected_again(self):
+        content = zip_bytes(**{'index.html': '<html>'})
+        self.submit(content)
+        with mock.patch('party.inspection.inspect_zip') as inspect_zip:
+            self.submit(content, 'again.zip')
+            inspect_zip.assert_not_called()
+        self.assertTrue(self.entry.sub_file.name.endswith('.zip'))
+        self.assertEqual(self.entry.manifest['file_count'], 1)
+
+    def test_admin_shows_manifest(self):
+        self.submit(zip_bytes(**{'index.html': '<html>'}))
+        User.objects.create_superuser('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+        response = self.client.get(reverse('admin:party_entry_changelist'))
+        self.assertContains(response, '✓ 1 files')
+        response = self.client.get(reverse('admin:party_entry_change', args=[self.entry.pk]))
+        self.assertContains(response, 'No problems found')
+
+    def test_inspect_entries_command(self):
+        with self.captureOnCommitCallbacks():
+            self.entry.sub_file = SimpleUploadedFile('demo.zip', zip_bytes(**{'index.html': '<html>'}))
+            self.entry.save()
+        call_command('inspect_entries', '--workers', '1', stdout=io.StringIO())
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.submission_problems, [])
+
+
+class StaticFilesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', '--noinput', verbosity=0)
+
+    def test_pages_use_hashed_names(self):
+        response = self.client.get(reverse('info'))
+        self.assertRegex(response.content.decode(), r'/static/vendor/htmx\.min\.[0-9a-f]{12}\.js')
+
+    def test_served_precompressed_and_immutable(self):
+        url = staticfiles_storage.url('vendor/htmx.min.js')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertLess(int(response['Content-Length']), os.path.getsize(staticfiles_storage.path('vendor/htmx.min.js')))
+
+    def test_vendored_htmx_is_pinned_version(self):
+        self.assertEqual(checks.check_vendored_htmx(None), [])
+
+
+class VendorHtmxTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        path = Path(self.directory.name) / 'htmx.min.js'
+        path.write_text('var htmx={version:"1.9.10"};')
+        patcher = mock.patch.object(checks, 'HTMX_PATH', path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def download(self, content):
+        response = mock.MagicMock()
+        response.__enter__.return_value.read.return_value = content
+        return mock.patch('urllib.request.urlopen', return_value=response)
+
+    @override_settings(HTMX_VERSION='1.9.12')
+    def test_other_version_is_reported(self):
+        self.assertEqual([error.id for error in checks.check_vendored_htmx(None)], ['party.W001'])
+
+    @override_settings(HTMX_VERSION='1.9.12')
+    def test_pinned_version_is_vendored(self):
+        with self.download(b'var htmx={version:"1.9.12"};') as urlopen:
+            call_command('vendor_htmx', stdout=io.StringIO())
+        self.assertIn('htmx.org@1.9.12/', urlopen.call_args.args[0])
+        self.assertEqual(checks.vendored_htmx_version(), '1.9.12')
+        self.assertEqual(checks.check_vendored_htmx(None), [])
+
+    @override_settings(HTMX_VERSION='1.9.12')
+    def test_wrong_download_is_rejected(self):
+        with self.download(b'var htmx={version:"2.0.0"};'), self.assertRaises(CommandError):
+            call_command('vendor_htmx', stdout=io.StringIO())
+        self.assertEqual(checks.vendored_htmx_version(), '1.9.10')
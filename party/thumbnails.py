@@ -0,0 +1,189 @@
+"""
+Thumbnail renditions of entries.
+
+The uploaded thumbnail is kept as is. Cropped and resized renditions are
+rendered in the background into a directory named after the hash of the
+uploaded file, so they are only rendered again when the image content changes.
+
+Images are decoded at the lowest resolution that still covers the largest
+rendition where the format allows it (JPEG draft mode). Other formats are
+decoded in full, so images that would decode to more than THUMBNAIL_MAX_PIXELS
+pixels are rejected, WebPs counted at DECODE_COST times their size. Processing
+an image at the default budget of 8.5 megapixels peaks at about 45 MB for PNG,
+50 MB for WebP and 55 MB for GIF, which is converted to RGB before resizing.
+JPEGs stay under about 25 MB whatever their size.
+"""
+import hashlib
+import logging
+import math
+import os
+import shutil
+from pathlib import Path
+
+from PIL import ExifTags, Image, ImageOps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+
+# name: (size, formats)
+RENDITIONS = {
+    'youtube': ((1280, 720), ['jpg']),
+    'preview': ((640, 360), ['webp', 'jpg']),
+    'small': ((320, 180), ['webp', 'jpg']),
+}
+
+PIL_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+
+# Modes that can be resized as is, others are converted to RGB first
+RESIZE_MODES = ['RGB', 'RGBA', 'L']
+
+# Pixels counted per decoded pixel, libwebp keeps several full-size buffers while decoding
+DECODE_COST = {'WEBP': 3}
+
+# EXIF orientations that rotate the image by 90 or 270 degrees
+ROTATED_ORIENTATIONS = [5, 6, 7, 8]
+
+
+def file_hash(file):
+    """sha256 of the file, read in chunks"""
+    digest = hashlib.sha256()
+    with file.open('rb'):
+        for chunk in file.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def rendition_dir(content_hash):
+    return f'thumbnails/renditions/{content_hash}'
+
+
+def rendition_name(content_hash, name, ext):
+    return f'{rendition_dir(content_hash)}/{name}.{ext}'
+
+
+def rendition_urls(content_hash):
+    """{name: {ext: url}} of the renditions rendered from the image with the hash"""
+    return {
+        name: {ext: default_storage.url(rendition_name(content_hash, name, ext)) for ext in formats}
+        for name, (size, formats) in RENDITIONS.items()
+    }
+
+
+def missing_renditions(content_hash):
+    return [
+        (name, size, ext)
+        for name, (size, formats) in RENDITIONS.items()
+        for ext in formats
+        if not default_storage.exists(rendition_name(content_hash, name, ext))
+    ]
+
+
+def crop_box(size, aspect_ratio):
+    """Box of the largest centered area of the given aspect ratio"""
+    img_width, img_height = size
+
+    if img_width / img_height > aspect_ratio:
+        # Image is wider than the aspect ratio, crop width
+        new_width = img_height * aspect_ratio
+        new_height = img_height
+    else:
+        # Image is taller than the aspect ratio, crop height
+        new_width = img_width
+        new_height = img_width / aspect_ratio
+
+    left = (img_width - new_width) / 2
+    top = (img_height - new_height) / 2
+    return (left, top, left + new_width, top + new_height)
+
+
+def prepare_decoding(img):
+    """
+    Sets up decoding of the opened, not yet loaded image and returns the crop box
+    and target size of the largest rendition in the stored orientation of the image.
+
+    JPEGs are decoded at 1/2, 1/4 or 1/8 scale when that still covers the crop.
+    Raises ValidationError when the image would decode to more pixels than allowed.
+    """
+    width, height = max(size for size, formats in RENDITIONS.values())
+    # Rotated images are stored sideways, so the crop is taken sideways as well
+    if img.getexif().get(ExifTags.Base.Orientation, 1) in ROTATED_ORIENTATIONS:
+        width, height = height, width
+
+    left, top, right, bottom = crop_box(img.size, width / height)
+    scale = min((right - left) / width, (bottom - top) / height)
+    if scale > 1:
+        img.draft('RGB', (math.ceil(img.width / scale), math.ceil(img.height / scale)))
+
+    max_pixels = settings.THUMBNAIL_MAX_PIXELS // DECODE_COST.get(img.format, 1)
+    if img.width * img.height > max_pixels:
+        raise ValidationError(
+            f"The image is too large to process ({img.width}×{img.height}), "
+            f"please upload an image of at most {max_pixels / 1_000_000:.1f} megapixels"
+        )
+    return crop_box(img.size, width / height), (width, height)
+
+
+def validate_thumbnail_size(value):
+    """Rejects uploaded thumbnails that would decode to more pixels than allowed, reading only the header"""
+    if getattr(value, '_committed', True):
+        return
+    try:
+        with Image.open(value.file) as img:
+            prepare_decoding(img)
+    finally:
+        value.file.seek(0)
+
+
+def render_renditions(path, content_hash, renditions):
+    """Renders the given (name, size, ext) renditions of the image at path"""
+    with Image.open(path) as img:
+        box, size = prepare_decoding(img)
+        if img.mode not in RESIZE_MODES:
+            img = img.convert('RGB')
+        # Only the decoded image and the largest rendition are in memory at once
+        largest = img.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0)
+
+    largest = ImageOps.exif_transpose(largest).convert('RGB')
+    for name, size, ext in renditions:
+        target = Path(default_storage.path(rendition_name(content_hash, name, ext)))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f'{target.name}.tmp')
+        rendition = largest if largest.size == size else largest.resize(size, Image.LANCZOS)
+        rendition.save(tmp_path, PIL_FORMATS[ext], quality=90)
+        os.replace(tmp_path, target)
+
+
+def process_thumbnail(entry_pk):
+    """Renders the missing renditions of the thumbnail of the entry and records its hash"""
+    from party.models import Entry
+
+    entry = Entry.objects.filter(pk=entry_pk).only('thumbnail', 'thumbnail_hash').first()
+    if entry is None or not entry.thumbnail:
+        return
+
+    content_hash = file_hash(entry.thumbnail)
+    missing = missing_renditions(content_hash)
+    if missing:
+        try:
+            render_renditions(entry.thumbnail.path, content_hash, missing)
+        except ValidationError as error:
+            # Only reached by thumbnails that bypassed the form validation, e.g. saved in code
+            logger.error("Thumbnail %s of entry %s rejected: %s", entry.thumbnail.name, entry_pk, error.message)
+            Entry.objects.filter(pk=entry_pk, thumbnail=entry.thumbnail.name).update(thumbnail_hash='')
+            remove_unused_renditions(entry.thumbnail_hash)
+            return
+
+    # Skipped if another thumbnail was uploaded in the meantime, its own job records it
+    Entry.objects.filter(pk=entry_pk, thumbnail=entry.thumbnail.name).update(thumbnail_hash=content_hash)
+
+
+def remove_unused_renditions(content_hash):
+    """Deletes the renditions rendered from the image with the hash, unless an entry still uses them"""
+    from party.models import Entry
+
+    if content_hash and not Entry.objects.filter(thumbnail_hash=content_hash).exists():
+        shutil.rmtree(default_storage.path(rendition_dir(content_hash)), ignore_errors=True)
@@ -0,0 +1,186 @@
+"""
+Chunked, resumable uploads of entry files.
+
+The client starts an upload with the size and checksum of the file, then
+sends the chunks in any order and as many times as needed, each with its own
+sha256. The checksum of the file is the sha256 of the sha256 digests of its
+chunks in order, so the browser can compute it without holding the file in
+memory. Every verified chunk is stored as its own file, so the received chunks
+are known after a dropped connection or a page reload. Completing the upload
+assembles the chunks and verifies the checksum of the whole file, and saving
+the entry form moves the file into place. Uploads that are never attached to
+an entry are removed after UPLOAD_MAX_AGE.
+"""
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from party.models import Upload
+from tasks.queue import enqueue
+
+
+READ_SIZE = 64 * 1024
+
+
+def upload_dir(upload):
+    return Path(settings.UPLOADS_DIR) / str(upload.pk)
+
+
+def chunk_path(upload, index):
+    return upload_dir(upload) / f'chunk-{index:06d}'
+
+
+def assembled_path(upload):
+    return upload_dir(upload) / 'file'
+
+
+def received_chunks(upload):
+    return [index for index in range(upload.chunk_count) if chunk_path(upload, index).exists()]
+
+
+def upload_status(upload):
+    return {
+        'id': str(upload.pk),
+        'chunk_size': upload.chunk_size,
+        'chunk_count': upload.chunk_count,
+        'received': received_chunks(upload),
+        'complete': upload.completed_at is not None,
+    }
+
+
+def start_upload(owner, compo, filename, size, sha256):
+    """Creates an upload, raises ValidationError if the file can't be submitted to the compo"""
+    compo.check_deadlines(file_changed=True)
+    if not filename.lower().endswith('.zip'):
+        raise ValidationError("Only zip files can be submitted")
+    if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+        raise ValidationError(f"The file must be at most {settings.UPLOAD_MAX_SIZE // 1024 // 1024} MB")
+    if len(sha256) != 64:
+        raise ValidationError("Invalid sha256")
+
+    upload = Upload.objects.create(
+        owner=owner, compo=compo, filename=os.path.basename(filename), size=size,
+        sha256=sha256.lower(), chunk_size=settings.UPLOAD_CHUNK_SIZE,
+    )
+    upload_dir(upload).mkdir(parents=True, exist_ok=True)
+    enqueue(purge_uploads, key='purge-uploads')
+    return upload
+
+
+def receive_chunk(upload, index, stream, sha256):
+    """Streams a chunk to disk and keeps it if its length and sha256 match"""
+    if upload.completed_at is not None:
+        raise ValidationError("The upload is already complete")
+    if not 0 <= index < upload.chunk_count:
+        raise ValidationError("Invalid chunk")
+
+    length = upload.chunk_length(index)
+    path = chunk_path(upload, index)
+    tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    digest = hashlib.sha256()
+    received = 0
+    try:
+        with open(tmp_path, 'wb') as file:
+            while received <= length:
+                data = stream.read(READ_SIZE)
+                if not data:
+                    break
+                received += len(data)
+                digest.update(data)
+                file.write(data)
+        if received != length:
+            raise ValidationError(f"Expected {length} bytes, received {received}")
+        if digest.hexdigest() != sha256.lower():
+            raise ValidationError("Chunk checksum mismatch")
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def complete_upload(upload):
+    """Assembles the received chunks and verifies the whole file"""
+    if upload.completed_at is not None:
+        return upload
+
+    missing = upload.chunk_count - len(received_chunks(upload))
+    if missing:
+        raise ValidationError(f"{missing} chunks are missing")
+
+    path = assembled_path(upload)
+    tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as file:
+            for index in range(upload.chunk_count):
+                chunk_digest = hashlib.sha256()
+                with open(chunk_path(upload, index), 'rb') as chunk:
+                    while data := chunk.read(READ_SIZE):
+                        chunk_digest.update(data)
+                        file.write(data)
+                digest.update(chunk_digest.digest())
+
+        if digest.hexdigest() != upload.sha256:
+            # Every chunk matched its own hash, so the client has to start over
+            for index in range(upload.chunk_count):
+                chunk_path(upload, index).unlink(missing_ok=True)
+            raise ValidationError("File checksum mismatch, please upload the file again")
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    for index in range(upload.chunk_count):
+        chunk_path(upload, index).unlink(missing_ok=True)
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['completed_at'])
+    return upload
+
+
+def attach_upload(upload, entry):
+    """Saves the entry with the assembled file of the completed upload as its sub_file"""
+    name = default_storage.get_available_name(entry.sub_file.field.generate_filename(entry, upload.filename))
+    target = Path(default_storage.path(name))
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    # Moved next to the target first, which may copy across file systems, so
+    # that the file appears at its final name complete or not at all
+    tmp_path = target.with_name(f'{target.name}.{uuid.uuid4().hex}.tmp')
+    file_move_safe(assembled_path(upload), tmp_path, allow_overwrite=True)
+    os.replace(tmp_path, target)
+
+    try:
+        with transaction.atomic():
+            entry.sub_file.name = name
+            entry.save()
+            upload.delete()
+    except Exception:
+        # Moved back so that the upload can be attached again
+        file_move_safe(target, assembled_path(upload), allow_overwrite=True)
+        raise
+    return entry
+
+
+def purge_uploads():
+    """Deletes the uploads older than UPLOAD_MAX_AGE and the files of uploads that no longer exist"""
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_MAX_AGE)
+    # Their directories are removed by the post_delete signal
+    Upload.objects.filter(created_at__lt=cutoff).delete()
+
+    uploads_dir = Path(settings.UPLOADS_DIR)
+    if not uploads_dir.exists():
+        return
+    existing = {str(pk) for pk in Upload.objects.values_list('pk', flat=True)}
+    for path in uploads_dir.iterdir():
+        # Recent directories may belong to an upload that is just being started
+        if path.name not in existing and path.stat().st_mtime < time.time() - settings.UPLOAD_MAX_AGE:
+            shutil.rmtree(path, ignore_errors=True)
@@ -1,15 +1,21 @@
+import json
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, Http404
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from django.views.generic import ListView, TemplateView
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView
 from django.urls import reverse_lazy
-from django.db.models import Sum
 
 from party.mixins import OwnerRequiredMixin, StaffRequiredMixin
-from party.models import Compo, Party, Entry 
+from party.models import Compo, Party, Entry, Upload, get_active_party
 from party.forms import EntryForm
+from party import publishing, uploads
 
 
 class PartyDetailView(DetailView):
@@ -17,7 +23,10 @@ class PartyDetailView(DetailView):
     template_name = 'party/party_detail.html'
 
     def get_object(self, queryset=None):
-        return self.model.objects.get(is_active=True)
+        party = get_active_party()
+        if party is None:
+            raise Http404("No active party")
+        return party
 
 
 class UpdateEntryView(OwnerRequiredMixin, UpdateView):
@@ -26,6 +35,9 @@ class UpdateEntryView(OwnerRequiredMixin, UpdateView):
     form_class = EntryForm
     success_url = reverse_lazy('entries')
 
+    def get_form_kwargs(self):
+        return {**super().get_form_kwargs(), 'user': self.request.user}
+
     def get_success_url(self):
         return self.success_url
 
@@ -53,32 +65,77 @@ class CreateEntryView(LoginRequiredMixin, CreateView):
         initial["compo"] = get_object_or_404(Compo, pk=self.kwargs["compo_pk"])
         return initial
 
-    def form_valid(self, form):
-        entry = form.save(commit=False)
-        entry.owner = self.request.user 
+    def get_form_kwargs(self):
+        return {**super().get_form_kwargs(), 'user': self.request.user}
 
-        entry.save()
+    def form_valid(self, form):
+        form.instance.owner = self.request.user
+        form.save()
         return HttpResponseRedirect(reverse_lazy('entries'))
     
 
 class YoutubeDescView(StaffRequiredMixin, DetailView):
     template_name = 'party/youtube.html'
-    model = Compo
+    queryset = Compo.objects.select_related('party')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["entries"] = self.calculate_positions(self.get_object().entries.all())
+        context["entries"] = publishing.compo_publishing(self.object)
         return context
-    
-    @staticmethod
-    def calculate_positions(entry_qs):
-        entries = entry_qs.annotate(total_points=Sum('votes__points')).order_by('-total_points')
-        positions = []
-        position = 1
-
-        for index, entry in enumerate(entries):
-            if index > 0 and entry.total_points < entries[index - 1].total_points:
-                position = index + 1
-            positions.append((position, entry))
-
-        return positions
+
+
+@staff_member_required
+@require_GET
+def publishing_export(request, pk):
+    """Publishing data of every entry of the party as JSON, or as CSV with ?format=csv"""
+    party = get_object_or_404(Party, pk=pk)
+    entries = publishing.party_publishing(party)
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(publishing.as_csv(entries), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{party.slug or party.pk}-publishing.csv"'
+        return response
+    return JsonResponse(publishing.as_json(party, entries), json_dumps_params={'ensure_ascii': False})
+
+
+@login_required
+@require_POST
+def start_upload(request):
+    try:
+        data = json.loads(request.body)
+        compo = get_object_or_404(Compo, pk=int(data['compo']))
+        upload = uploads.start_upload(request.user, compo, str(data['filename']), int(data['size']), str(data['sha256']))
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': "Invalid data"}, status=400)
+    except ValidationError as error:
+        return JsonResponse({'error': error.message}, status=400)
+    return JsonResponse(uploads.upload_status(upload), status=201)
+
+
+@login_required
+@require_GET
+def upload_status(request, pk):
+    upload = get_object_or_404(Upload, pk=pk, owner=request.user)
+    return JsonResponse(uploads.upload_status(upload))
+
+
+@login_required
+@require_http_methods(['PUT'])
+def upload_chunk(request, pk, index):
+    upload = get_object_or_404(Upload, pk=pk, owner=request.user)
+    try:
+        # Read from the request stream so the chunk is never held in memory
+        uploads.receive_chunk(upload, index, request, request.headers.get('X-Chunk-Sha256', ''))
+    except ValidationError as error:
+        return JsonResponse({'error': error.message}, status=400)
+    return JsonResponse({'received': index})
+
+
+@login_required
+@require_POST
+def complete_upload(request, pk):
+    upload = get_object_or_404(Upload, pk=pk, owner=request.user)
+    try:
+        uploads.complete_upload(upload)
+    except ValidationError as error:
+        return JsonResponse({'error': error.message}, status=400)
+    return JsonResponse(uploads.upload_status(upload))
@@ -0,0 +1,86 @@
+"""
+Admin changelists for tables that grow large during a party, like votes and vote keys.
+
+Counting all rows and paging with OFFSET both read through the whole table. The
+count of an unfiltered table is estimated from its highest id instead, and lists
+in their default order of descending id are paged with the last id of the
+previous page (keyset pagination), so every page is read from the primary key
+index however deep it is.
+"""
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+KEYSET_VAR = 'after'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Estimates the count of an unfiltered table from its highest id, deleted rows are counted too"""
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return super().count
+        self.estimated = True
+        return queryset.model._base_manager.aggregate(highest=Max('pk'))['highest'] or 0
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Pages with ?after=<id> while the list is in the default ordering of its ModelAdmin,
+    which has to be ['-pk']. Sorting by a column falls back to numbered pages.
+    Not for ModelAdmins with list_editable.
+    """
+    def __init__(self, request, *args, **kwargs):
+        self.after = request.GET.get(KEYSET_VAR)
+        self.next_after = None
+        super().__init__(request, *args, **kwargs)
+        # Not carried over to the sorting and filter links
+        self.params.pop(KEYSET_VAR, None)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(KEYSET_VAR, None)
+        return params
+
+    @property
+    def keyset_paginated(self):
+        return ORDER_VAR not in self.params and list(self.model_admin.ordering or []) == ['-pk']
+
+    def get_results(self, request):
+        if not self.keyset_paginated:
+            return super().get_results(request)
+
+        queryset = self.queryset
+        if self.after:
+            try:
+                queryset = queryset.filter(pk__lt=int(self.after))
+            except ValueError:
+                raise IncorrectLookupParameters
+        # One more than fits on the page tells if there is a next page
+        result_list = list(queryset[:self.list_per_page + 1])
+        if len(result_list) > self.list_per_page:
+            result_list = result_list[:self.list_per_page]
+            self.next_after = result_list[-1].pk
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.result_list = result_list
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = bool(self.after or self.next_after)
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string()
+
+    @property
+    def next_page_url(self):
+        return self.get_query_string({KEYSET_VAR: self.next_after})
@@ -0,0 +1,31 @@
+from django.db import connection, OperationalError
+
+
+class QueryStatsMiddleware:
+    """
+    Adds the number of SQL queries run by the request as an X-Query-Count header,
+    and X-Database-Locked when the request failed because SQLite was locked
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+
+        response['X-Query-Count'] = queries
+        if getattr(request, 'database_locked', False):
+            response['X-Database-Locked'] = '1'
+        return response
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, OperationalError) and 'locked' in str(exception):
+            request.database_locked = True
+        return None
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,11 +42,13 @@ INSTALLED_APPS = [
     'vote',
     'beamer',
     'accounts',
+    'tasks',
     'adminsortable2',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,6 +57,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Reports the number of SQL queries of each request in a response header, used by the load test
+QUERY_STATS = int(os.environ.get("QUERY_STATS", 0))
+if QUERY_STATS:
+    MIDDLEWARE.insert(0, 'pms.middleware.QueryStatsMiddleware')
+
 ROOT_URLCONF = 'pms.urls'
 
 TEMPLATES = [
@@ -106,6 +114,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'party': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+        },
     },
 }
 
@@ -114,8 +126,21 @@ LOGGING = {
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db' / 'db.sqlite3',
+        'ENGINE': 'pms.sqlite3',
+        'NAME': os.environ.get("DATABASE_PATH", BASE_DIR / 'db' / 'db.sqlite3'),
+        'OPTIONS': {
+            # Seconds a connection waits for the write lock before giving up
+            'timeout': 20,
+        },
+        # Persistent connections aren't reused under ASGI: every request to a sync view
+        # runs in a new thread, whose connection would stay open (Django ticket #33497)
+        'CONN_MAX_AGE': int(os.environ.get("CONN_MAX_AGE", 0)),
+        'CONN_HEALTH_CHECKS': True,
+        # A file instead of the default in-memory database, so that tests see the
+        # same locking behaviour between connections as the workers do
+        'TEST': {
+            'NAME': os.path.join(tempfile.gettempdir(), 'pms-test.sqlite3'),
+        },
     }
 }
 
@@ -163,11 +188,84 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Version of static/vendor/htmx.min.js, updated with the vendor_htmx command
+HTMX_VERSION = '1.9.10'
+
+# collectstatic adds a content hash to the file names and writes gzip and brotli
+# versions next to them. WhiteNoise serves them from the app, the hashed names
+# with a far future, immutable Cache-Control, so browsers fetch each version once.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'pms.storage.StaticFilesStorage',
+    },
+}
+# Unhashed names are used for files that haven't been collected instead of an error
+WHITENOISE_MANIFEST_STRICT = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Runtime state shared between the worker processes on this host
+RUNTIME_DIR = Path(os.environ.get("RUNTIME_DIR", BASE_DIR / 'db' / 'run'))
+
+# Shared by all worker processes without a separate cache server
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': RUNTIME_DIR / 'cache',
+    }
+}
+# Replaces the cache above with one in memory and the directories of files with temporary ones while the tests run
+TEST_RUNNER = 'pms.test_runner.TestRunner'
+
+# How often (in seconds) each worker process checks the live state of the compos
+# that have open event streams. Only one check per compo, however many streams.
+LIVE_STATE_POLL_INTERVAL = 0.02
+LIVE_STATE_HEARTBEAT = 15
+
+# Number of resolved vote keys each worker process keeps in memory
+VOTEKEY_CACHE_SIZE = 10000
+
+# Background tasks, run by manage.py run_tasks. Eager runs them in the process
+# that queued them once its transaction commits instead, which is useful for tests.
+TASKS_EAGER = False
+TASKS_CONCURRENCY = 2
+TASKS_MAX_ATTEMPTS = 3
+# Seconds before the first retry, doubled for every further one
+TASKS_RETRY_DELAY = 10
+# Seconds a claimed task is leased to a worker, renewed while it runs
+TASKS_LEASE = 300
+# Seconds finished tasks are kept for the admin
+TASKS_KEEP_FINISHED = 7 * 24 * 3600
+
+# Prebuilt export archives of compos
+EXPORTS_DIR = Path(os.environ.get("EXPORTS_DIR", RUNTIME_DIR / 'exports'))
+
+# Directory of the party on scene.org, for the publishing export
+SCENE_ORG_PARTY_DIR = os.environ.get("SCENE_ORG_PARTY_DIR", 'parties/2025/graffathon25')
+
+# Chunked entry uploads are staged here until the entry is saved with them
+UPLOADS_DIR = Path(os.environ.get("UPLOADS_DIR", RUNTIME_DIR / 'uploads'))
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+# Seconds after which uploads that weren't attached to an entry are deleted
+UPLOAD_MAX_AGE = 2 * 24 * 3600
+
+# Limits of submitted zips, checked by party.inspection
+ENTRY_MAX_FILE_COUNT = 20000
+ENTRY_MAX_UNCOMPRESSED_SIZE = 8 * 1024 * 1024 * 1024
+
+# Largest thumbnail accepted, in pixels after reduced-resolution decoding. Only JPEGs
+# are decoded at reduced resolution, so this is also the largest PNG, GIF or WebP,
+# a 4K screenshot fits. Processing takes about 5 bytes per decoded pixel, see
+# manage.py thumbnail_benchmark
+THUMBNAIL_MAX_PIXELS = 8_500_000
+
 # Importing local settings
 try:
     from pms.settings_local import *
@@ -0,0 +1,30 @@
+"""
+SQLite backend tuned for several gunicorn workers writing to the same database file.
+
+- The WAL journal lets readers and the writer work at the same time.
+- Transactions start with BEGIN IMMEDIATE, so they take the write lock up front
+  and wait for it (see the timeout option) instead of failing with "database is
+  locked" when a read transaction later tries to write. This includes atomic()
+  blocks that only read, so keep them short.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pragmas = {
+        'journal_mode': 'WAL',
+        # Safe with WAL: a power loss can lose the last commits, but never corrupts the database
+        'synchronous': 'NORMAL',
+        # In KiB when negative
+        'cache_size': -20000,
+        'temp_store': 'MEMORY',
+    }
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
@@ -0,0 +1,26 @@
+import functools
+import random
+import time
+
+from django.db import OperationalError
+
+
+def retry_on_locked(func=None, attempts=3, delay=0.05):
+    """
+    Retries the function when SQLite reports the database as locked even after waiting
+    for the busy timeout. Only use this for functions that are safe to run again.
+    """
+    if func is None:
+        return functools.partial(retry_on_locked, attempts=attempts, delay=delay)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if 'locked' not in str(e) or attempt == attempts:
+                    raise
+                # Jitter so that the retrying writers don't all collide again
+                time.sleep(delay * attempt * random.uniform(0.5, 1.5))
+    return wrapper
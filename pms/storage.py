@@ -0,0 +1,17 @@
+from urllib.parse import unquote, urlsplit
+
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Fingerprinted static files with gzip and brotli versions. Files that
+    haven't been collected keep their unhashed names, so pages render before
+    collectstatic has been run, e.g. in the tests.
+    """
+
+    def hashed_name(self, name, content=None, filename=None):
+        path = urlsplit(unquote(filename or name)).path.strip()
+        if content is None and not self.manifest_strict and not self.exists(path):
+            return name
+        return super().hashed_name(name, content, filename)
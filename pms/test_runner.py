@@ -0,0 +1,32 @@
+import tempfile
+from pathlib import Path
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests with an in-memory cache and with RUNTIME_DIR, MEDIA_ROOT and STATIC_ROOT
+    in a temporary directory removed afterwards, so they never touch the files of the site
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.files_dir = tempfile.TemporaryDirectory(prefix='pms-test-')
+        files_dir = Path(self.files_dir.name)
+        runtime_dir = files_dir / 'run'
+        self.test_settings = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            RUNTIME_DIR=runtime_dir,
+            EXPORTS_DIR=runtime_dir / 'exports',
+            UPLOADS_DIR=runtime_dir / 'uploads',
+            MEDIA_ROOT=str(files_dir / 'media'),
+            STATIC_ROOT=str(files_dir / 'static'),
+        )
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        self.files_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
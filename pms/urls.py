@@ -26,8 +26,13 @@ urlpatterns = [
     path('entry/<int:pk>', views.UpdateEntryView.as_view(), name="update-entry"),
     path('', views.PartyDetailView.as_view(), name='party'),
     path('entries/', views.EntryList.as_view(), name='entries'),
+    path('entry-uploads/', views.start_upload, name='start-upload'),
+    path('entry-uploads/<uuid:pk>', views.upload_status, name='upload-status'),
+    path('entry-uploads/<uuid:pk>/chunks/<int:index>', views.upload_chunk, name='upload-chunk'),
+    path('entry-uploads/<uuid:pk>/complete', views.complete_upload, name='complete-upload'),
     path('info/', views.InfoView.as_view(), name='info'),
     path('youtube/<int:pk>', views.YoutubeDescView.as_view(), name='compo-youtube-desc'),
+    path('publishing/<int:pk>', views.publishing_export, name='party-publishing'),
 
     path('accounts/signup/', SignUpView.as_view(), name='signup'),
     path("accounts/login/", LoginView.as_view(), name='login'),
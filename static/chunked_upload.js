@@ -0,0 +1,125 @@
+// Uploads the entry file in chunks before the entry form is submitted. Failed
+// chunks are retried, and an interrupted upload of the same file continues
+// where it stopped, also after a reload. Without Web Crypto the file is
+// submitted with the form as before.
+(function () {
+    const form = document.querySelector('form[data-chunked-upload]');
+    if (!form || !window.crypto || !crypto.subtle) {
+        return;
+    }
+    const uploadsUrl = form.dataset.chunkedUpload;
+    const fileInput = form.querySelector('input[type=file][name=sub_file]');
+    const uploadInput = form.querySelector('input[name=upload]');
+    const compoInput = form.querySelector('[name=compo]');
+    const progress = form.querySelector('[data-upload-progress]');
+    const errors = form.querySelector('[data-upload-errors]');
+    const csrfToken = form.querySelector('[name=csrfmiddlewaretoken]').value;
+
+    class UploadError extends Error {}
+
+    async function sha256(data) {
+        const digest = await crypto.subtle.digest('SHA-256', data);
+        return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function request(method, url, body, headers) {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(url, {
+                    method, body, headers: {'X-CSRFToken': csrfToken, ...headers}, credentials: 'same-origin',
+                });
+                if (response.status < 500) {
+                    const data = await response.json();
+                    if (!response.ok) {
+                        throw new UploadError(data.error || 'The upload failed');
+                    }
+                    return data;
+                }
+            } catch (error) {
+                if (error instanceof UploadError) {
+                    throw error;
+                }
+            }
+            // Network error or busy server
+            if (attempt === 6) {
+                throw new UploadError('The upload failed, please check your connection and try again');
+            }
+            await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** attempt));
+        }
+    }
+
+    // The sha256 of the sha256 digests of the chunks, read one chunk at a time
+    async function checksum(file, chunkSize) {
+        const chunkCount = Math.ceil(file.size / chunkSize);
+        const digests = new Uint8Array(chunkCount * 32);
+        for (let index = 0; index < chunkCount; index++) {
+            const chunk = await file.slice(index * chunkSize, (index + 1) * chunkSize).arrayBuffer();
+            digests.set(new Uint8Array(await crypto.subtle.digest('SHA-256', chunk)), index * 32);
+        }
+        return sha256(digests);
+    }
+
+    async function resumeOrStart(file, storageKey) {
+        const id = localStorage.getItem(storageKey);
+        if (id) {
+            try {
+                return await request('GET', `${uploadsUrl}${id}`);
+            } catch (error) {
+                localStorage.removeItem(storageKey);
+            }
+        }
+        const status = await request('POST', uploadsUrl, JSON.stringify({
+            compo: compoInput.value,
+            filename: file.name,
+            size: file.size,
+            sha256: await checksum(file, Number(uploadInput.dataset.chunkSize)),
+        }), {'Content-Type': 'application/json'});
+        localStorage.setItem(storageKey, status.id);
+        return status;
+    }
+
+    async function upload(file) {
+        const storageKey = `upload:${compoInput.value}:${file.name}:${file.size}:${file.lastModified}`;
+        let status = await resumeOrStart(file, storageKey);
+        const received = new Set(status.received);
+
+        progress.hidden = false;
+        progress.max = status.chunk_count;
+        progress.value = received.size;
+        for (let index = 0; index < status.chunk_count && !status.complete; index++) {
+            if (received.has(index)) {
+                continue;
+            }
+            const chunk = await file.slice(index * status.chunk_size, (index + 1) * status.chunk_size).arrayBuffer();
+            await request('PUT', `${uploadsUrl}${status.id}/chunks/${index}`, chunk, {'X-Chunk-Sha256': await sha256(chunk)});
+            progress.value += 1;
+        }
+
+        try {
+            status = await request('POST', `${uploadsUrl}${status.id}/complete`);
+        } finally {
+            // A mismatching file has to be uploaded again from the start
+            localStorage.removeItem(storageKey);
+        }
+        return status.id;
+    }
+
+    form.addEventListener('submit', async (event) => {
+        const file = fileInput && fileInput.files[0];
+        if (!file) {
+            return;
+        }
+        event.preventDefault();
+        errors.textContent = '';
+        form.querySelector('[type=submit]').disabled = true;
+        try {
+            uploadInput.value = await upload(file);
+            // The file is attached from the upload, not sent again with the form
+            fileInput.disabled = true;
+            form.submit();
+        } catch (error) {
+            errors.textContent = error.message;
+            form.querySelector('[type=submit]').disabled = false;
+        }
+    });
+})();
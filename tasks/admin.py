@@ -0,0 +1,57 @@
+from django.contrib import admin, messages
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from tasks.models import Task, TaskStatus
+from tasks.queue import queue_stats
+
+
+@admin.action(description="Run selected tasks again")
+def retry_tasks(modeladmin, request, queryset):
+    finished = queryset.exclude(status__in=[TaskStatus.QUEUED, TaskStatus.RUNNING]).order_by('-pk')
+    # Only one task per key can be queued, the latest selected one unless one is queued already
+    queued_keys = set(Task.objects.filter(status=TaskStatus.QUEUED, key__isnull=False).values_list('key', flat=True))
+    retried, skipped = [], []
+    for pk, key in finished.values_list('pk', 'key'):
+        if key is not None and key in queued_keys:
+            skipped.append(key)
+        else:
+            retried.append(pk)
+            if key is not None:
+                queued_keys.add(key)
+
+    try:
+        with transaction.atomic():
+            count = Task.objects.filter(pk__in=retried).update(
+                status=TaskStatus.QUEUED, attempts=0, run_at=timezone.now(), locked_by='', locked_until=None,
+            )
+    except IntegrityError:
+        # A task with one of the keys was queued in the meantime
+        modeladmin.message_user(request, "A task with the same key was just queued, please try again", messages.ERROR)
+        return
+
+    modeladmin.message_user(request, f"Queued {count} tasks again")
+    if skipped:
+        modeladmin.message_user(
+            request, f"Skipped {len(skipped)} tasks whose key is queued already: {', '.join(sorted(set(skipped)))}",
+            messages.WARNING,
+        )
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'key', 'status', 'attempts', 'created_at', 'wait', 'duration']
+    list_filter = ['status', 'name']
+    search_fields = ['key']
+    actions = [retry_tasks]
+    change_list_template = 'admin/tasks/task/change_list.html'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), 'stats': queue_stats()}
+        return super().changelist_view(request, extra_context)
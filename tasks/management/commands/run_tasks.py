@@ -0,0 +1,74 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tasks import queue
+
+
+def close_inherited_connections():
+    # Forked worker processes open their own database connections
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Runs queued background tasks until stopped with SIGTERM or SIGINT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.TASKS_CONCURRENCY, help="Number of tasks run at once")
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread', help="Run the tasks in threads or in processes")
+        parser.add_argument('--poll-interval', type=float, default=1, help="Seconds between checks for new tasks")
+        parser.add_argument('--burst', action='store_true', help="Exit once there are no tasks ready to run")
+
+    def handle(self, *args, **options):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        concurrency = options['concurrency']
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        if options['pool'] == 'process':
+            connections.close_all()
+            executor = ProcessPoolExecutor(concurrency, initializer=close_inherited_connections)
+        else:
+            executor = ThreadPoolExecutor(concurrency, thread_name_prefix='task')
+
+        self.stdout.write(f"Worker {worker_id} running {concurrency} tasks at once in a {options['pool']} pool")
+        running = {}
+        last_renewed = last_purged = time.monotonic()
+        with executor:
+            while running or not self.stopping:
+                if not self.stopping and len(running) < concurrency:
+                    for task in queue.claim(worker_id, concurrency - len(running)):
+                        running[executor.submit(queue.execute, task.name, task.args)] = task
+                if not running and options['burst']:
+                    break
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                if not running:
+                    time.sleep(options['poll_interval'])
+                for future in done:
+                    task = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        queue.finish(task, result=future.result())
+                    else:
+                        self.stderr.write(f"Task {task} failed (attempt {task.attempts}/{task.max_attempts}): {error!r}")
+                        queue.finish(task, error=queue.format_error(error))
+
+                now = time.monotonic()
+                if now - last_renewed > settings.TASKS_LEASE / 3:
+                    queue.renew(worker_id)
+                    last_renewed = now
+                if now - last_purged > 3600:
+                    queue.purge()
+                    last_purged = now
+
+    def stop(self, signum, frame):
+        self.stdout.write("Stopping after the running tasks have finished")
+        self.stopping = True
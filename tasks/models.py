@@ -0,0 +1,51 @@
+from django.db import models
+from django.db.models import Q
+
+
+class TaskStatus(models.TextChoices):
+    QUEUED = 'Q', 'Queued'
+    RUNNING = 'R', 'Running'
+    DONE = 'D', 'Done'
+    FAILED = 'F', 'Failed'
+
+
+class Task(models.Model):
+    """A function call queued to run in the task worker, see tasks.queue"""
+    name = models.CharField(max_length=255, help_text="Dotted path of the function")
+    args = models.JSONField(default=list)
+    key = models.CharField(max_length=255, null=True, blank=True, help_text="Only one queued task can have the same key")
+    status = models.CharField(max_length=1, choices=TaskStatus, default=TaskStatus.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_at = models.DateTimeField(help_text="When the task is ready to run, later for retries")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=Q(status=TaskStatus.QUEUED), name='unique_queued_task_key'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name}({', '.join(map(repr, self.args))})"
+
+    @property
+    def wait(self):
+        """Time from being ready to run to being started"""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.run_at
+
+    @property
+    def duration(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
@@ -0,0 +1,149 @@
+"""
+Background task queue stored in the database.
+
+Tasks are queued in the transaction of the change that needs them, so they
+are only run if it commits. Workers claim ready tasks by leasing them with a
+single conditional UPDATE, which works without row locks on SQLite. A worker
+keeps renewing the leases of the tasks it runs, so the tasks of a worker that
+died are claimed again by another worker once their lease runs out.
+"""
+import json
+import statistics
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Min, Q, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from tasks.models import Task, TaskStatus
+
+
+def enqueue(func, *args, key=None, max_attempts=None, delay=0):
+    """
+    Queues func(*args) to run in the task worker, args have to be JSON serializable.
+    While a task with the same key is queued and not started yet, the new one is dropped.
+    """
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: func(*args))
+        return
+
+    task = Task(
+        name=f'{func.__module__}.{func.__qualname__}',
+        args=list(args),
+        key=key,
+        max_attempts=max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    # Skipped by the unique index of queued keys, without an error
+    Task.objects.bulk_create([task], ignore_conflicts=True)
+
+
+def ready_tasks(now):
+    lease_expired = Q(status=TaskStatus.RUNNING, locked_until__lt=now)
+    return Task.objects.filter(Q(status=TaskStatus.QUEUED, run_at__lte=now) | lease_expired)
+
+
+def claim(worker_id, limit):
+    """Leases up to limit ready tasks to the worker and returns them"""
+    now = timezone.now()
+    candidates = ready_tasks(now).order_by('run_at', 'pk').values('pk')[:limit]
+    # The conditions are checked again by the UPDATE, so a task is only claimed once
+    claimed = ready_tasks(now).filter(pk__in=Subquery(candidates)).update(
+        status=TaskStatus.RUNNING,
+        locked_by=worker_id,
+        locked_until=now + timedelta(seconds=settings.TASKS_LEASE),
+        started_at=now,
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return []
+    return list(Task.objects.filter(status=TaskStatus.RUNNING, locked_by=worker_id, started_at=now))
+
+
+def renew(worker_id):
+    """Extends the leases of the tasks the worker is running"""
+    Task.objects.filter(status=TaskStatus.RUNNING, locked_by=worker_id).update(
+        locked_until=timezone.now() + timedelta(seconds=settings.TASKS_LEASE),
+    )
+
+
+def execute(name, args):
+    """Runs the function of a task, in a worker thread or process"""
+    close_old_connections()
+    try:
+        return import_string(name)(*args)
+    finally:
+        connection.close()
+
+
+def finish(task, result=None, error=None):
+    """Records the outcome of a task, and queues it again after a delay if it failed and has attempts left"""
+    now = timezone.now()
+    # Only if the lease wasn't lost to another worker in the meantime
+    leased = Task.objects.filter(pk=task.pk, status=TaskStatus.RUNNING, locked_by=task.locked_by)
+
+    if error is None:
+        try:
+            json.dumps(result)
+        except TypeError:
+            result = repr(result)
+        leased.update(status=TaskStatus.DONE, finished_at=now, locked_until=None, result=result, error='')
+    elif task.attempts < task.max_attempts:
+        try:
+            leased.update(
+                status=TaskStatus.QUEUED, locked_by='', locked_until=None, error=error,
+                run_at=now + timedelta(seconds=settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)),
+            )
+        except IntegrityError:
+            # The same task has been queued again meanwhile, that one runs instead
+            leased.update(status=TaskStatus.FAILED, finished_at=now, locked_until=None, error=error)
+    else:
+        leased.update(status=TaskStatus.FAILED, finished_at=now, locked_until=None, error=error)
+
+
+def format_error(exception):
+    return ''.join(traceback.format_exception(exception))
+
+
+def purge():
+    """Deletes the finished tasks that are older than TASKS_KEEP_FINISHED"""
+    cutoff = timezone.now() - timedelta(seconds=settings.TASKS_KEEP_FINISHED)
+    Task.objects.filter(status__in=[TaskStatus.DONE, TaskStatus.FAILED], finished_at__lt=cutoff).delete()
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(0, round(percent / 100 * len(values)) - 1)]
+
+
+def queue_stats(period=timedelta(hours=1)):
+    """Queue depth by status and the wait and run times of the tasks finished in the period"""
+    now = timezone.now()
+    counts = dict(Task.objects.values_list('status').annotate(Count('pk')).order_by())
+    oldest_ready = Task.objects.filter(status=TaskStatus.QUEUED, run_at__lte=now).aggregate(Min('run_at'))['run_at__min']
+
+    finished = Task.objects.filter(finished_at__gte=now - period).values_list('run_at', 'started_at', 'finished_at')
+    waits = [(started_at - run_at).total_seconds() for run_at, started_at, finished_at in finished]
+    durations = [(finished_at - started_at).total_seconds() for run_at, started_at, finished_at in finished]
+
+    def summary(values):
+        if not values:
+            return None
+        return {
+            'mean': statistics.mean(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'max': max(values),
+        }
+
+    return {
+        'counts': {status.label: counts.get(status.value, 0) for status in TaskStatus},
+        'ready': Task.objects.filter(status=TaskStatus.QUEUED, run_at__lte=now).count(),
+        'oldest_ready_age': (now - oldest_ready).total_seconds() if oldest_ready else None,
+        'finished': len(waits),
+        'wait': summary(waits),
+        'duration': summary(durations),
+    }
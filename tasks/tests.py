@@ -0,0 +1,134 @@
+import io
+import threading
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tasks import queue
+from tasks.models import Task, TaskStatus
+
+
+calls = []
+
+
+def record(*args):
+    calls.append(args)
+    return len(calls)
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+@override_settings(TASKS_EAGER=False, TASKS_RETRY_DELAY=10)
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def run_worker(self):
+        call_command('run_tasks', '--burst', '--poll-interval', '0', stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_run_task(self):
+        queue.enqueue(record, 1, 'a')
+        self.run_worker()
+        self.assertEqual(calls, [(1, 'a')])
+        task = Task.objects.get()
+        self.assertEqual(task.status, TaskStatus.DONE)
+        self.assertEqual(task.result, 1)
+        self.assertEqual(task.attempts, 1)
+
+    def test_deduplication_while_queued(self):
+        queue.enqueue(record, 1, key='same')
+        queue.enqueue(record, 2, key='same')
+        self.assertEqual(Task.objects.count(), 1)
+
+        self.run_worker()
+        # Queued again once the previous one has started
+        queue.enqueue(record, 3, key='same')
+        self.assertEqual(Task.objects.filter(status=TaskStatus.QUEUED).count(), 1)
+
+    def test_retries_with_backoff(self):
+        queue.enqueue(fail, 'boom', max_attempts=2)
+        self.run_worker()
+        task = Task.objects.get()
+        self.assertEqual(task.status, TaskStatus.QUEUED)
+        self.assertIn('ValueError: boom', task.error)
+        self.assertGreater(task.run_at, timezone.now() + timedelta(seconds=5))
+
+        Task.objects.update(run_at=timezone.now())
+        self.run_worker()
+        task.refresh_from_db()
+        self.assertEqual(task.status, TaskStatus.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    def test_expired_lease_is_claimed_again(self):
+        queue.enqueue(record, 1)
+        [task] = queue.claim('dead-worker', 10)
+        self.assertEqual(queue.claim('other-worker', 10), [])
+
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [task] = queue.claim('other-worker', 10)
+        self.assertEqual(task.attempts, 2)
+        # The late result of the first worker is ignored
+        queue.finish(Task(pk=task.pk, locked_by='dead-worker'), result='late')
+        task.refresh_from_db()
+        self.assertEqual(task.status, TaskStatus.RUNNING)
+
+    def test_admin_shows_queue_stats(self):
+        queue.enqueue(record, 1)
+        queue.enqueue(record, 2, delay=60)
+        self.run_worker()
+        User.objects.create_superuser('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+        response = self.client.get(reverse('admin:tasks_task_changelist'))
+        self.assertContains(response, 'Queued: 1, Running: 0, Done: 1, Failed: 0')
+        self.assertContains(response, 'Finished in the last hour: 1')
+
+    def test_admin_retries_one_task_per_key(self):
+        for message in ['a', 'b', 'c']:
+            queue.enqueue(fail, message, key=f'key-{message}', max_attempts=1)
+            self.run_worker()
+        queue.enqueue(fail, 'a', key='key-a')
+        Task.objects.filter(args=['c']).update(key='key-b')
+        User.objects.create_superuser('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+        response = self.client.post(reverse('admin:tasks_task_changelist'), {
+            'action': 'retry_tasks',
+            '_selected_action': list(Task.objects.filter(status=TaskStatus.FAILED).values_list('pk', flat=True)),
+        }, follow=True)
+        self.assertContains(response, 'Queued 1 tasks again')
+        self.assertContains(response, 'Skipped 2 tasks whose key is queued already: key-a, key-b')
+        queued = Task.objects.filter(status=TaskStatus.QUEUED)
+        self.assertEqual(sorted(task.args[0] for task in queued), ['a', 'c'])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queue.enqueue(record, 1)
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [(1,)])
+        self.assertFalse(Task.objects.exists())
+
+
+@override_settings(TASKS_EAGER=False)
+class ConcurrentClaimTests(TransactionTestCase):
+    def test_every_task_is_claimed_once(self):
+        for i in range(50):
+            queue.enqueue(record, i)
+
+        claimed = []
+        def worker(worker_id):
+            while tasks := queue.claim(worker_id, 3):
+                claimed.extend(task.pk for task in tasks)
+
+        threads = [threading.Thread(target=worker, args=[f'worker-{i}']) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(claimed), sorted(Task.objects.values_list('pk', flat=True)))
@@ -2,19 +2,43 @@ from django.contrib import admin
 from django.shortcuts import render, redirect
 from django.urls import path
 from django import forms 
-from django.db import IntegrityError
+from django.db.models import Count
 
 from party.models import Party
+from pms.changelists import EstimatedCountPaginator, KeysetChangeList
 from vote.models import VoteKey, Vote
+from vote.utils import import_votekeys
 
 class VoteKeyForm(forms.Form):
     party = forms.ModelChoiceField(required=True, queryset=Party.objects.all())
-    keys = forms.CharField(required=True, widget=forms.Textarea)
+    file = forms.FileField(required=False, help_text='A text file with one key per line')
+    keys = forms.CharField(required=False, widget=forms.Textarea)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('file') and not cleaned_data.get('keys'):
+            raise forms.ValidationError('Upload a file or paste the keys')
+        return cleaned_data
 
 class VoteKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'party', 'vote_count']
     list_filter = ['party__title']
+    list_select_related = ['party']
+    ordering = ['-pk']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     change_list_template = 'admin/votekeys_changelist.html'
 
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(vote_count=Count('vote'))
+
+    @admin.display(description='Votes', ordering='vote_count')
+    def vote_count(self, votekey):
+        return votekey.vote_count
+
     def get_urls(self):
         urls = super().get_urls()
         additional_urls = [
@@ -24,33 +48,39 @@ class VoteKeyAdmin(admin.ModelAdmin):
 
     def import_keys(self, request):
         if  request.method == 'POST':
-            form = VoteKeyForm(request.POST)
+            form = VoteKeyForm(request.POST, request.FILES)
             if form.is_valid():
-                keys = form.cleaned_data['keys'].splitlines()
                 party = form.cleaned_data['party']
-                import_failed = 0
-                for key in keys:
-                    try:
-                        VoteKey.objects.create(
-                            party=party,
-                            key=key
-                        )
-                    except IntegrityError:
-                        import_failed += 1
-
-                import_total = len(keys)
-                import_success = import_total - import_failed
-                message = f"Imported {import_success} keys successfully, {import_failed} failed. (Total: {import_total})"
+                # The file is read line by line, not loaded into memory at once
+                lines = form.cleaned_data['file'] or form.cleaned_data['keys'].splitlines()
+                counts = import_votekeys(party.pk, lines)
+                message = (
+                    f"Imported {counts['imported']} of {counts['total']} keys, "
+                    f"{counts['duplicates']} were duplicates and {counts['invalid']} were too long"
+                )
                 self.message_user(request, message)
                 return redirect('..')
+        else:
+            form = VoteKeyForm()
 
-
-        form = VoteKeyForm()
         context = {'form': form, 'opts': self.model._meta}
         return render(
             request, 'admin/import_keys.html', context
         )
 
 
+class VoteAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'votekey', 'entry', 'points', 'updated_at']
+    list_filter = ['entry__compo__party__title', 'points']
+    list_select_related = ['votekey', 'entry__compo__party']
+    raw_id_fields = ['entry', 'votekey']
+    ordering = ['-pk']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
 admin.site.register(VoteKey, VoteKeyAdmin)
-admin.site.register(Vote)
\ No newline at end of file
+admin.site.register(Vote, VoteAdmin)
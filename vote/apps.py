@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VoteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vote'
+
+    def ready(self):
+        from vote import checks, signals  # noqa: F401
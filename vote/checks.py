@@ -0,0 +1,19 @@
+from django.core.checks import Error, Tags, register
+from django.db import connection
+
+from vote import scores
+
+
+@register(Tags.database)
+def check_score_triggers(app_configs, databases=None, **kwargs):
+    """Results are read from the tallies, so the triggers that keep them up to date have to exist"""
+    if not databases or 'vote_entryscore' not in connection.introspection.table_names():
+        return []
+    missing = scores.missing_triggers()
+    if missing:
+        return [Error(
+            f"The score tally triggers {', '.join(missing)} are missing, so votes no longer update the results",
+            hint="Run python manage.py rebuild_scores",
+            id='vote.E001',
+        )]
+    return []
@@ -0,0 +1,329 @@
+"""
+Live voting state of compos shared between worker processes.
+
+The state of every compo is a fixed size record in a memory-mapped file under
+RUNTIME_DIR, written through once a save of the compo has been committed or
+the beamer has moved to another slide, and rebuilt from the database by the
+rebuild_live_state command when the site starts. Reading it costs no
+database query or system call. Every record starts with a version that is odd
+while the record is being written, so readers retry instead of seeing a
+partial state. In each process a single watcher per compo checks the version
+to notice changes and wakes up all the open event streams of the compo, so
+waiting voters and mirrored beamers don't cost any polling of their own.
+"""
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import struct
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from party.models import Compo, CompoVotingStatus
+
+
+VERSION = struct.Struct('<Q')
+# present, voting_status, current_entry_pos, beamer_seq, has_slide, beamer_slide
+FIELDS = struct.Struct('<?cqq?q')
+RECORD_SIZE = 64
+# Readers spinning this many times on a record being written check it under the lock
+READ_ATTEMPTS = 1000
+
+
+class StateStore:
+    """The records of all compos in one file, at the offset given by the pk of the compo"""
+
+    def __init__(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.map = None
+        self.remap()
+
+    def remap(self):
+        size = os.fstat(self.fd).st_size
+        if size and (self.map is None or len(self.map) < size):
+            # The previous map is closed once no reader uses it anymore
+            self.map = mmap.mmap(self.fd, size)
+
+    def record(self, compo_pk, grow=False):
+        """Returns the map containing the record of the compo and its offset, or None if the file is too short"""
+        offset = compo_pk * RECORD_SIZE
+        end = offset + RECORD_SIZE
+        if self.map is None or len(self.map) < end:
+            # Only grown under the lock, so that the file is never truncated
+            if grow and os.fstat(self.fd).st_size < end:
+                os.ftruncate(self.fd, -(-end // mmap.PAGESIZE) * mmap.PAGESIZE)
+            self.remap()
+            if self.map is None or len(self.map) < end:
+                return None
+        return self.map, offset
+
+
+_stores = {}
+
+
+def _store():
+    path = Path(settings.RUNTIME_DIR) / 'live' / 'state'
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = StateStore(path)
+    return store
+
+
+@contextmanager
+def _locked():
+    # Serializes the writes between processes and threads
+    path = Path(settings.RUNTIME_DIR) / 'live' / 'state.lock'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _write_state(compo_pk, state):
+    buffer, offset = _store().record(compo_pk, grow=True)
+    # Odd also if a writer died halfway, the record is complete again after this write
+    version = VERSION.unpack_from(buffer, offset)[0] | 1
+    VERSION.pack_into(buffer, offset, version)
+    if state is None:
+        FIELDS.pack_into(buffer, offset + VERSION.size, False, b' ', 0, 0, False, 0)
+    else:
+        slide = state['beamer_slide']
+        FIELDS.pack_into(
+            buffer, offset + VERSION.size, True, state['voting_status'].encode(), state['current_entry_pos'],
+            state['beamer_seq'], slide is not None, slide or 0,
+        )
+    VERSION.pack_into(buffer, offset, version + 1)
+
+
+def _read_record(buffer, offset):
+    """Returns the version and the fields of the record, or None if it is being written"""
+    version = VERSION.unpack_from(buffer, offset)[0]
+    if version % 2:
+        return None
+    fields = FIELDS.unpack_from(buffer, offset + VERSION.size)
+    if VERSION.unpack_from(buffer, offset)[0] != version:
+        return None
+    return version, fields
+
+
+def compo_state(compo):
+    return {
+        'compo_pk': compo.pk,
+        'current_entry_pos': compo.current_entry_pos,
+        'voting_status': compo.voting_status,
+        'voting_status_display': CompoVotingStatus(compo.voting_status).label,
+        'beamer_seq': compo.beamer_seq,
+        'beamer_slide': None,
+    }
+
+
+def publish_state(compo):
+    with _locked():
+        state = compo_state(compo)
+        previous = read_state(compo.pk, locked=True)
+        if previous is not None and previous['beamer_seq'] == compo.beamer_seq:
+            # The slide shown by the beamer is only kept in the state
+            state['beamer_slide'] = previous['beamer_slide']
+        _write_state(compo.pk, state)
+
+
+def publish_beamer_position(compo_pk, seq, current_entry_pos=None, slide=None):
+    """
+    Publishes the slide the beamer moved to, unless a newer position has been published already.
+    Without a seq the position is published regardless and the slide is left as it is.
+    The compo has been updated in the database before this, without a save() that would publish its state.
+    """
+    with _locked():
+        state = read_state(compo_pk, locked=True)
+        if state is None:
+            compo = Compo.objects.filter(pk=compo_pk).first()
+            if compo is None:
+                return
+            state = compo_state(compo)
+        elif seq is not None and state['beamer_seq'] > seq:
+            return
+
+        if seq is not None:
+            state['beamer_seq'] = seq
+            state['beamer_slide'] = slide if isinstance(slide, int) else None
+        if current_entry_pos is not None:
+            state['current_entry_pos'] = current_entry_pos
+        _write_state(compo_pk, state)
+
+
+def remove_state(compo_pk):
+    with _locked():
+        if _store().record(compo_pk) is not None:
+            _write_state(compo_pk, None)
+
+
+def rebuild_state():
+    """
+    Publishes the state of every compo from the database and removes the records of the compos that don't exist,
+    so that a restored or reset database isn't overridden by the records of its predecessor
+    """
+    compos = {compo.pk: compo for compo in Compo.objects.all()}
+    with _locked():
+        store = _store()
+        store.remap()
+        record_count = len(store.map) // RECORD_SIZE if store.map is not None else 0
+        for compo_pk in range(record_count):
+            if compo_pk not in compos and state_stamp(compo_pk) is not None:
+                _write_state(compo_pk, None)
+        for compo in compos.values():
+            _write_state(compo.pk, compo_state(compo))
+    return len(compos)
+
+
+def state_stamp(compo_pk):
+    """Returns a value that changes every time the state of the compo is published, None if there is no state"""
+    record = _store().record(compo_pk)
+    if record is None:
+        return None
+    buffer, offset = record
+    version = VERSION.unpack_from(buffer, offset)[0]
+    return version or None
+
+
+def read_state(compo_pk, locked=False):
+    """Returns the published state of the compo, locked is set by the writers that hold the lock already"""
+    record = _store().record(compo_pk)
+    if record is None:
+        return None
+
+    buffer, offset = record
+    for _ in range(1 if locked else READ_ATTEMPTS):
+        result = _read_record(buffer, offset)
+        if result is not None:
+            break
+    else:
+        if not locked:
+            with _locked():
+                result = _read_record(buffer, offset)
+        # Still odd if its writer died, then the state is loaded again by get_state
+        if result is None:
+            return None
+
+    version, (present, voting_status, current_entry_pos, beamer_seq, has_slide, beamer_slide) = result
+    if not present:
+        return None
+    voting_status = voting_status.decode()
+    return {
+        'compo_pk': compo_pk,
+        'current_entry_pos': current_entry_pos,
+        'voting_status': voting_status,
+        'voting_status_display': CompoVotingStatus(voting_status).label,
+        'beamer_seq': beamer_seq,
+        'beamer_slide': beamer_slide if has_slide else None,
+    }
+
+
+def get_state(compo_pk):
+    """
+    Returns the live state of the compo, loading it from the database if it hasn't been published yet.
+    Returns None if the compo does not exist.
+    """
+    state = read_state(compo_pk)
+    if state is None:
+        compo = Compo.objects.filter(pk=compo_pk).first()
+        if compo is None:
+            return None
+        publish_state(compo)
+        state = compo_state(compo)
+    return state
+
+
+class StateWatcher:
+    """Watches the state record of a compo for all the event streams of the compo in this process"""
+
+    def __init__(self, compo_pk):
+        self.compo_pk = compo_pk
+        self.stamp = state_stamp(compo_pk)
+        self.state = read_state(compo_pk)
+        self.version = 0
+        self.listeners = 0
+        self.changed = asyncio.Condition()
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while self.listeners:
+            await asyncio.sleep(settings.LIVE_STATE_POLL_INTERVAL)
+            stamp = state_stamp(self.compo_pk)
+            if stamp == self.stamp:
+                continue
+            self.stamp = stamp
+            # None once the compo has been deleted
+            state = read_state(self.compo_pk) if stamp is not None else None
+            if state != self.state or state is None:
+                self.state = state
+                self.version += 1
+                async with self.changed:
+                    self.changed.notify_all()
+            if state is None:
+                break
+        watchers = _watchers.get(asyncio.get_running_loop(), {})
+        if watchers.get(self.compo_pk) is self:
+            del watchers[self.compo_pk]
+
+
+# Watchers by event loop and compo
+_watchers = weakref.WeakKeyDictionary()
+
+
+def _watcher(compo_pk):
+    watchers = _watchers.setdefault(asyncio.get_running_loop(), {})
+    watcher = watchers.get(compo_pk)
+    if watcher is None or watcher.task.done():
+        watcher = watchers[compo_pk] = StateWatcher(compo_pk)
+    return watcher
+
+
+async def state_changes(compo_pk):
+    """
+    Yields the live state of the compo now and whenever it changes, and None as a heartbeat
+    after LIVE_STATE_HEARTBEAT seconds without changes. Ends when the compo is deleted.
+    """
+    watcher = _watcher(compo_pk)
+    watcher.listeners += 1
+    try:
+        version = watcher.version
+        if watcher.state is None:
+            return
+        yield watcher.state
+        while True:
+            try:
+                async with watcher.changed:
+                    await asyncio.wait_for(
+                        watcher.changed.wait_for(lambda: watcher.version != version),
+                        settings.LIVE_STATE_HEARTBEAT,
+                    )
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            version = watcher.version
+            if watcher.state is None:
+                return
+            yield watcher.state
+    finally:
+        watcher.listeners -= 1
+
+
+def event_stream(compo_pk):
+    """Server-sent event response with the live state of the compo"""
+    async def stream():
+        async for state in state_changes(compo_pk):
+            if state is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: live\ndata: {json.dumps(state)}\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from party.models import Party
+from vote.utils import generate_votekeys
+
+
+class Command(BaseCommand):
+    help = "Creates random vote keys for a party and prints them, one per line"
+
+    def add_arguments(self, parser):
+        parser.add_argument('party', help="Title of the party")
+        parser.add_argument('count', type=int, help="Number of keys to create")
+        parser.add_argument('--length', type=int, default=8, help="Characters per key")
+
+    def handle(self, *args, **options):
+        party = Party.objects.filter(title=options['party']).first()
+        if party is None:
+            raise CommandError(f"Party {options['party']} does not exist")
+        if options['count'] < 1 or options['length'] < 6:
+            raise CommandError("Create at least one key of at least 6 characters")
+
+        keys = generate_votekeys(party.pk, options['count'], options['length'])
+        self.stdout.write('\n'.join(keys))
+        self.stderr.write(self.style.SUCCESS(f"Created {len(keys)} keys for {party}"))
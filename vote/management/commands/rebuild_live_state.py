@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from vote import live
+
+
+class Command(BaseCommand):
+    help = "Publishes the live state of every compo from the database, run at startup before the workers"
+
+    def handle(self, *args, **options):
+        count = live.rebuild_state()
+        self.stdout.write(self.style.SUCCESS(f"Published the live state of {count} compos"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vote import scores
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-entry score tallies from the vote table, or verifies them with --check"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only verify the tallies, exit with an error if they are out of date")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            missing = scores.missing_triggers()
+            mismatches = scores.find_mismatches()
+            if missing:
+                self.stderr.write(f"Missing triggers: {', '.join(missing)}")
+            if mismatches:
+                self.stderr.write(f"Tallies out of date for entries: {', '.join(map(str, mismatches))}")
+            if missing or mismatches:
+                raise CommandError("Score tallies are out of date, run rebuild_scores to fix them")
+            self.stdout.write(self.style.SUCCESS("Score tallies are up to date"))
+            return
+
+        scores.rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt score tallies"))
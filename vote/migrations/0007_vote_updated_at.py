@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vote', '0006_alter_vote_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BACKFILL_SQL = """
+    INSERT INTO vote_entryscore (entry_id, total, vote_count, points_0, points_1, points_2, points_3, points_4, points_5)
+    SELECT entry_id, SUM(points), COUNT(*),
+        SUM(points = 0), SUM(points = 1), SUM(points = 2), SUM(points = 3), SUM(points = 4), SUM(points = 5)
+    FROM vote_vote
+    GROUP BY entry_id
+"""
+
+# The trigger SQL is frozen here, vote.scores keeps the current version for rebuild_scores
+CREATE_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER vote_entryscore_insert AFTER INSERT ON vote_vote
+    BEGIN
+        INSERT INTO vote_entryscore (entry_id, total, vote_count, points_0, points_1, points_2, points_3, points_4, points_5)
+        VALUES (NEW.entry_id, NEW.points, 1, NEW.points = 0, NEW.points = 1, NEW.points = 2, NEW.points = 3, NEW.points = 4, NEW.points = 5)
+        ON CONFLICT (entry_id) DO UPDATE SET
+            total = total + excluded.total,
+            vote_count = vote_count + 1,
+            points_0 = points_0 + excluded.points_0, points_1 = points_1 + excluded.points_1, points_2 = points_2 + excluded.points_2,
+            points_3 = points_3 + excluded.points_3, points_4 = points_4 + excluded.points_4, points_5 = points_5 + excluded.points_5;
+    END
+    """,
+    """
+    CREATE TRIGGER vote_entryscore_update AFTER UPDATE OF entry_id, points ON vote_vote
+    BEGIN
+        UPDATE vote_entryscore SET
+            total = total - OLD.points,
+            vote_count = vote_count - 1,
+            points_0 = points_0 - (OLD.points = 0), points_1 = points_1 - (OLD.points = 1), points_2 = points_2 - (OLD.points = 2),
+            points_3 = points_3 - (OLD.points = 3), points_4 = points_4 - (OLD.points = 4), points_5 = points_5 - (OLD.points = 5)
+        WHERE entry_id = OLD.entry_id;
+        INSERT INTO vote_entryscore (entry_id, total, vote_count, points_0, points_1, points_2, points_3, points_4, points_5)
+        VALUES (NEW.entry_id, NEW.points, 1, NEW.points = 0, NEW.points = 1, NEW.points = 2, NEW.points = 3, NEW.points = 4, NEW.points = 5)
+        ON CONFLICT (entry_id) DO UPDATE SET
+            total = total + excluded.total,
+            vote_count = vote_count + 1,
+            points_0 = points_0 + excluded.points_0, points_1 = points_1 + excluded.points_1, points_2 = points_2 + excluded.points_2,
+            points_3 = points_3 + excluded.points_3, points_4 = points_4 + excluded.points_4, points_5 = points_5 + excluded.points_5;
+    END
+    """,
+    """
+    CREATE TRIGGER vote_entryscore_delete AFTER DELETE ON vote_vote
+    BEGIN
+        UPDATE vote_entryscore SET
+            total = total - OLD.points,
+            vote_count = vote_count - 1,
+            points_0 = points_0 - (OLD.points = 0), points_1 = points_1 - (OLD.points = 1), points_2 = points_2 - (OLD.points = 2),
+            points_3 = points_3 - (OLD.points = 3), points_4 = points_4 - (OLD.points = 4), points_5 = points_5 - (OLD.points = 5)
+        WHERE entry_id = OLD.entry_id;
+    END
+    """,
+]
+
+DROP_TRIGGERS_SQL = [
+    'DROP TRIGGER IF EXISTS vote_entryscore_insert',
+    'DROP TRIGGER IF EXISTS vote_entryscore_update',
+    'DROP TRIGGER IF EXISTS vote_entryscore_delete',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('party', '0022_alter_entry_sub_file'),
+        ('vote', '0007_vote_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryScore',
+            fields=[
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='party.entry')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('vote_count', models.PositiveIntegerField(default=0)),
+                ('points_0', models.PositiveIntegerField(default=0)),
+                ('points_1', models.PositiveIntegerField(default=0)),
+                ('points_2', models.PositiveIntegerField(default=0)),
+                ('points_3', models.PositiveIntegerField(default=0)),
+                ('points_4', models.PositiveIntegerField(default=0)),
+                ('points_5', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
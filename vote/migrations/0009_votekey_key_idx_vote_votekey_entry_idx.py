@@ -0,0 +1,41 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Only creates and drops indexes. Altering the votekey field the usual way would
+    rebuild the vote table on SQLite, which also drops the score triggers on it.
+    """
+
+    dependencies = [
+        ('party', '0028_entry_compo_order_idx'),
+        ('vote', '0008_entryscore'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='votekey',
+            index=models.Index(fields=['key'], name='votekey_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['votekey', 'entry'], name='vote_votekey_entry_idx'),
+        ),
+        # Covered by the new index, which starts with the same column
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='vote',
+                    name='votekey',
+                    field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='vote.votekey'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX IF EXISTS "vote_vote_votekey_id_64cc0e32"',
+                    'CREATE INDEX "vote_vote_votekey_id_64cc0e32" ON "vote_vote" ("votekey_id")',
+                ),
+            ],
+        ),
+    ]
@@ -2,11 +2,11 @@ from django.core.exceptions import PermissionDenied
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
 
-from vote.utils import votekey_valid
+from vote.utils import resolve_votekey
 
 class VoteKeyRequiredMixin:
     def dispatch(self, request, *args, **kwargs):
-        votekey = request.COOKIES.get('votekey')
-        if not votekey or not votekey_valid(votekey):
+        request.votekey_id = resolve_votekey(request.COOKIES.get('votekey'))
+        if request.votekey_id is None:
             return HttpResponseRedirect(reverse('vote-login'))
         return super().dispatch(request, *args, **kwargs)
\ No newline at end of file
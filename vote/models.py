@@ -10,6 +10,10 @@ class VoteKey(models.Model):
 
     class Meta:
         unique_together = ['party', 'key']
+        indexes = [
+            # Keys are looked up without the party, which leads the unique index
+            models.Index(fields=['key'], name='votekey_key_idx'),
+        ]
 
     def __str__(self):
         return self.key
@@ -28,8 +32,51 @@ POINTS = (
 
 class Vote(models.Model):
     entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name='votes')
-    votekey = models.ForeignKey(VoteKey, on_delete=models.SET_NULL, null=True, db_index=True)
+    votekey = models.ForeignKey(VoteKey, on_delete=models.SET_NULL, null=True, db_index=False)
     points = models.PositiveIntegerField(default=0, choices=POINTS)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ['entry', 'votekey']
\ No newline at end of file
+        unique_together = ['entry', 'votekey']
+        indexes = [
+            # The votes of a key, also within a compo's entries
+            models.Index(fields=['votekey', 'entry'], name='vote_votekey_entry_idx'),
+        ]
+
+    @classmethod
+    def cast(cls, entry, votekey_id, points):
+        """
+        Creates or updates the vote of the key for the entry with a single
+        INSERT ... ON CONFLICT DO UPDATE statement and returns it
+        """
+        vote = cls(entry=entry, votekey_id=votekey_id, points=points)
+        cls.objects.bulk_create(
+            [vote],
+            update_conflicts=True,
+            unique_fields=['entry', 'votekey'],
+            update_fields=['points', 'updated_at'],
+        )
+        return vote
+
+
+class EntryScore(models.Model):
+    """
+    Running tally of the votes of an entry, maintained by database triggers on the vote table.
+    See vote.scores.
+    """
+    entry = models.OneToOneField(Entry, on_delete=models.CASCADE, primary_key=True, related_name='score')
+    total = models.PositiveIntegerField(default=0)
+    vote_count = models.PositiveIntegerField(default=0)
+    points_0 = models.PositiveIntegerField(default=0)
+    points_1 = models.PositiveIntegerField(default=0)
+    points_2 = models.PositiveIntegerField(default=0)
+    points_3 = models.PositiveIntegerField(default=0)
+    points_4 = models.PositiveIntegerField(default=0)
+    points_5 = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.entry}: {self.total} points"
+
+    @property
+    def histogram(self):
+        return [getattr(self, f'points_{points}') for points, _ in POINTS]
\ No newline at end of file
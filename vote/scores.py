@@ -0,0 +1,106 @@
+"""
+Per-entry score tallies.
+
+The vote_entryscore table is kept up to date by SQLite triggers on vote_vote, so every
+vote write updates the tally in the same transaction no matter which code path made it.
+
+Django recreates the vote table on SQLite when some of its fields are altered, which
+drops the triggers. The vote.E001 check (`manage.py check --database default`) reports
+missing triggers, and entrypoint.sh runs `manage.py rebuild_scores` when they are missing
+or the tallies are out of date.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+
+from vote.models import Vote, EntryScore
+
+POINT_COLUMNS = [f'points_{points}' for points in range(6)]
+
+TRIGGER_NAMES = ['vote_entryscore_insert', 'vote_entryscore_update', 'vote_entryscore_delete']
+
+
+def _add_vote(row):
+    return f"""
+        INSERT INTO vote_entryscore (entry_id, total, vote_count, {', '.join(POINT_COLUMNS)})
+        VALUES ({row}.entry_id, {row}.points, 1, {', '.join(f'{row}.points = {points}' for points in range(6))})
+        ON CONFLICT (entry_id) DO UPDATE SET
+            total = total + excluded.total,
+            vote_count = vote_count + 1,
+            {', '.join(f'{column} = {column} + excluded.{column}' for column in POINT_COLUMNS)};
+    """
+
+
+def _remove_vote(row):
+    return f"""
+        UPDATE vote_entryscore SET
+            total = total - {row}.points,
+            vote_count = vote_count - 1,
+            {', '.join(f'{column} = {column} - ({row}.points = {points})' for points, column in enumerate(POINT_COLUMNS))}
+        WHERE entry_id = {row}.entry_id;
+    """
+
+
+CREATE_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER vote_entryscore_insert AFTER INSERT ON vote_vote
+    BEGIN {_add_vote('NEW')} END
+    """,
+    f"""
+    CREATE TRIGGER vote_entryscore_update AFTER UPDATE OF entry_id, points ON vote_vote
+    BEGIN {_remove_vote('OLD')} {_add_vote('NEW')} END
+    """,
+    f"""
+    CREATE TRIGGER vote_entryscore_delete AFTER DELETE ON vote_vote
+    BEGIN {_remove_vote('OLD')} END
+    """,
+]
+
+DROP_TRIGGERS_SQL = [f'DROP TRIGGER IF EXISTS {name}' for name in TRIGGER_NAMES]
+
+
+def missing_triggers():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'vote_vote'")
+        installed = {row[0] for row in cursor.fetchall()}
+    return [name for name in TRIGGER_NAMES if name not in installed]
+
+
+def tallies_from_votes():
+    """Computes the tallies of all entries that have votes directly from the vote table"""
+    return {
+        row.pop('entry_id'): row
+        for row in Vote.objects.order_by().values('entry_id').annotate(
+            total=Sum('points'),
+            vote_count=Count('pk'),
+            **{column: Count('pk', filter=Q(points=points)) for points, column in enumerate(POINT_COLUMNS)},
+        )
+    }
+
+
+def stored_tallies():
+    return {
+        row.pop('entry_id'): row
+        for row in EntryScore.objects.filter(vote_count__gt=0).values('entry_id', 'total', 'vote_count', *POINT_COLUMNS)
+    }
+
+
+def find_mismatches():
+    """Returns the ids of entries whose stored tally doesn't match their votes"""
+    expected = tallies_from_votes()
+    stored = stored_tallies()
+    return sorted(
+        entry_id for entry_id in expected.keys() | stored.keys()
+        if expected.get(entry_id) != stored.get(entry_id)
+    )
+
+
+def rebuild():
+    """Reinstalls the triggers and recomputes every tally from the vote table"""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for sql in DROP_TRIGGERS_SQL + CREATE_TRIGGERS_SQL:
+                cursor.execute(sql)
+        EntryScore.objects.all().delete()
+        EntryScore.objects.bulk_create(
+            EntryScore(entry_id=entry_id, **tally) for entry_id, tally in tallies_from_votes().items()
+        )
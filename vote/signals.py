@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from party.models import Compo
+from vote import live
+from vote.models import VoteKey
+from vote.utils import invalidate_votekeys
+
+
+@receiver(post_save, sender=Compo)
+def publish_live_state(sender, instance, **kwargs):
+    # Only once committed, readers take the live state as it is
+    transaction.on_commit(lambda: live.publish_state(instance))
+
+
+@receiver(post_delete, sender=Compo)
+def remove_live_state(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: live.remove_state(pk))
+
+
+@receiver(post_save, sender=VoteKey)
+@receiver(post_delete, sender=VoteKey)
+def invalidate_votekey_cache(sender, **kwargs):
+    invalidate_votekeys()
@@ -1,3 +1,591 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import threading
 
-# Create your tests here.
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from party.models import Party, Compo, Entry, CompoVotingStatus, get_active_party
+from party.results import compo_results, party_results
+from party.testing import create_compo
+from vote import checks, live, scores
+from vote.models import VoteKey, Vote, EntryScore
+from vote.utils import VoteKeyCache, resolve_votekey, invalidate_votekeys, import_votekeys
+
+
+@override_settings(LIVE_STATE_POLL_INTERVAL=0.01)
+class LiveStateEventsTests(TestCase):
+    def setUp(self):
+        self.compo = create_compo(entry_count=3, voting_status=CompoVotingStatus.LIVE)
+        VoteKey.objects.create(party=self.compo.party, key='secret')
+        self.async_client.cookies['votekey'] = 'secret'
+
+    def save_compo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.compo.save()
+
+    def test_compo_save_publishes_state(self):
+        self.compo.current_entry_pos = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            self.compo.save()
+        state = live.read_state(self.compo.pk)
+        self.assertEqual(state['current_entry_pos'], 2)
+        self.assertEqual(state['voting_status'], CompoVotingStatus.LIVE)
+
+    def test_sync_request_is_told_to_poll(self):
+        self.client.cookies['votekey'] = 'secret'
+        response = self.client.get(reverse('live-state-events', args=[self.compo.pk]))
+        self.assertEqual(response.status_code, 204)
+
+    async def test_event_sent_only_on_change(self):
+        response = await self.async_client.get(reverse('live-state-events', args=[self.compo.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        first = await anext(events)
+        self.assertIn(b'event: live', first)
+
+        self.compo.current_entry_pos = 3
+        await sync_to_async(self.save_compo)()
+        second = await anext(events)
+        data = json.loads(second.decode().split('data: ')[1])
+        self.assertEqual(data['current_entry_pos'], 3)
+
+
+class LiveStateStoreTests(TestCase):
+    def setUp(self):
+        self.compo = create_compo(entry_count=3, voting_status=CompoVotingStatus.LIVE, current_entry_pos=2)
+        self.votekey = VoteKey.objects.create(party=self.compo.party, key='secret')
+        self.client.cookies['votekey'] = 'secret'
+
+    def test_available_entries_read_live_state_from_store(self):
+        live.get_state(self.compo.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('available-entries', args=[self.compo.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query['sql'] for query in queries if 'FROM "party_compo"' in query['sql']])
+
+    def test_pages_show_live_state_from_store(self):
+        live.get_state(self.compo.pk)
+        # Bypasses the write-through, so only a read from the database would see it
+        Compo.objects.filter(pk=self.compo.pk).update(current_entry_pos=3, voting_status=CompoVotingStatus.OPEN)
+        response = self.client.get(reverse('available-entries', args=[self.compo.pk]))
+        self.assertEqual(response.content.count(b'<form'), 2)
+        self.assertContains(self.client.get(reverse('vote', args=[self.compo.pk])), CompoVotingStatus.LIVE.label)
+
+    def test_state_is_shared_with_other_processes(self):
+        live.get_state(self.compo.pk)
+        read, write = multiprocessing.Pipe()
+        process = multiprocessing.get_context('fork').Process(
+            target=lambda: write.send(live.read_state(self.compo.pk)),
+        )
+        self.compo.current_entry_pos = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            self.compo.save()
+        process.start()
+        process.join()
+        self.assertEqual(read.recv()['current_entry_pos'], 3)
+
+    def test_record_of_a_dead_writer_is_loaded_again(self):
+        live.get_state(self.compo.pk)
+        buffer, offset = live._store().record(self.compo.pk)
+        version = live.VERSION.unpack_from(buffer, offset)[0]
+        live.VERSION.pack_into(buffer, offset, version + 1)
+
+        self.assertIsNone(live.read_state(self.compo.pk))
+        self.assertEqual(live.get_state(self.compo.pk)['current_entry_pos'], 2)
+        self.assertEqual(live.read_state(self.compo.pk)['current_entry_pos'], 2)
+
+    def test_rolled_back_save_is_not_published(self):
+        live.get_state(self.compo.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.compo.voting_status = CompoVotingStatus.CLOSED
+                    self.compo.save()
+                    raise ValidationError("Rolled back")
+            except ValidationError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(live.read_state(self.compo.pk)['voting_status'], CompoVotingStatus.LIVE)
+
+    def test_rebuild_replaces_records_of_another_database(self):
+        live.get_state(self.compo.pk)
+        # Left by a compo of the other database
+        live.publish_state(Compo(pk=self.compo.pk + 1, voting_status=CompoVotingStatus.OPEN))
+        self.assertIsNotNone(live.read_state(self.compo.pk + 1))
+        Compo.objects.filter(pk=self.compo.pk).update(current_entry_pos=3)
+        call_command('rebuild_live_state', stdout=StringIO())
+        self.assertEqual(live.read_state(self.compo.pk)['current_entry_pos'], 3)
+        self.assertIsNone(live.read_state(self.compo.pk + 1))
+
+    def test_deleted_compo_has_no_state(self):
+        pk = self.compo.pk
+        live.get_state(pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.compo.delete()
+        self.assertIsNone(live.read_state(pk))
+        self.assertIsNone(live.get_state(pk))
+
+
+@override_settings(LIVE_STATE_POLL_INTERVAL=0.01)
+class BeamerSyncTests(TestCase):
+    def setUp(self):
+        self.compo = create_compo(entry_count=3, voting_status=CompoVotingStatus.LIVE)
+        self.admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(self.admin)
+        self.async_client.force_login(self.admin)
+
+    def post_position(self, seq, current_entry, slide=None):
+        return self.client.post(reverse('record-entry-pos'), {
+            'compo_pk': self.compo.pk, 'current_entry': current_entry, 'slide': slide, 'seq': seq,
+        }, content_type='application/json')
+
+    def test_late_positions_are_ignored(self):
+        self.assertTrue(self.post_position(10, 3, slide=4).json()['applied'])
+        self.assertFalse(self.post_position(9, 2, slide=3).json()['applied'])
+
+        self.compo.refresh_from_db()
+        self.assertEqual(self.compo.current_entry_pos, 3)
+        state = live.read_state(self.compo.pk)
+        self.assertEqual((state['current_entry_pos'], state['beamer_slide'], state['beamer_seq']), (3, 4, 10))
+
+    def test_only_position_is_updated(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post_position(1, 2)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "party_compo"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('voting_status', updates[0])
+
+    def test_position_without_seq_is_always_written(self):
+        self.post_position(5, 3, slide=4)
+        response = self.client.post(reverse('record-entry-pos'), {'compo_pk': self.compo.pk, 'current_entry': 2},
+                                    content_type='application/json')
+        self.assertTrue(response.json()['applied'])
+        self.compo.refresh_from_db()
+        self.assertEqual((self.compo.current_entry_pos, self.compo.beamer_seq), (2, 5))
+        state = live.read_state(self.compo.pk)
+        self.assertEqual((state['current_entry_pos'], state['beamer_slide'], state['beamer_seq']), (2, 4, 5))
+
+    def test_position_invalidates_cached_compos(self):
+        self.assertEqual(get_active_party().compo_set.get().current_entry_pos, 0)
+        self.post_position(1, 2)
+        self.assertEqual(get_active_party().compo_set.get().current_entry_pos, 2)
+
+    def test_invalid_position_is_rejected(self):
+        self.assertEqual(self.post_position(1, 'next').status_code, 400)
+        self.assertEqual(self.post_position('1', 2).status_code, 400)
+        self.assertEqual(self.post_position(1, -1).status_code, 400)
+        self.assertEqual(self.post_position(-1, 2).status_code, 400)
+        self.assertEqual(self.post_position(2 ** 63, 2).status_code, 400)
+        self.assertEqual(self.post_position(True, 2).status_code, 400)
+        self.assertEqual(self.post_position(2 ** 63 - 1, 2).status_code, 200)
+        response = self.client.post(reverse('record-entry-pos'), {'compo_pk': 'demo', 'current_entry': 2},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_compo_save_keeps_beamer_slide(self):
+        self.post_position(5, 2, slide=3)
+        self.compo.refresh_from_db()
+        self.compo.voting_status = CompoVotingStatus.OPEN
+        with self.captureOnCommitCallbacks(execute=True):
+            self.compo.save()
+        self.assertEqual(live.read_state(self.compo.pk)['beamer_slide'], 3)
+
+    async def test_position_is_broadcast_to_all_streams(self):
+        url = reverse('beamer-events', args=[self.compo.pk])
+        streams = [aiter((await self.async_client.get(url)).streaming_content) for _ in range(3)]
+        for events in streams:
+            await anext(events)
+
+        await sync_to_async(self.post_position)(7, 2, slide=3)
+        for events in streams:
+            data = json.loads((await anext(events)).decode().split('data: ')[1])
+            self.assertEqual((data['current_entry_pos'], data['beamer_slide'], data['beamer_seq']), (2, 3, 7))
+
+    async def test_events_require_staff(self):
+        await self.async_client.alogout()
+        response = await self.async_client.get(reverse('beamer-events', args=[self.compo.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class EntriesToVoteForTests(TestCase):
+    def count_queries(self, entry_count):
+        compo = create_compo(entry_count=entry_count, title=f'Compo {entry_count}', voting_status=CompoVotingStatus.OPEN)
+        votekey = VoteKey.objects.create(party=compo.party, key=f'key-{entry_count}')
+        for entry in compo.entries.all()[:entry_count // 2]:
+            Vote.objects.create(entry=entry, votekey=votekey, points=3)
+
+        self.client.cookies['votekey'] = votekey.key
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('available-entries', args=[compo.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b'<form'), entry_count)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_entries(self):
+        self.assertEqual(self.count_queries(2), self.count_queries(20))
+
+    def test_existing_votes_are_shown(self):
+        compo = create_compo(entry_count=2, voting_status=CompoVotingStatus.OPEN)
+        votekey = VoteKey.objects.create(party=compo.party, key='secret')
+        entry = compo.entries.first()
+        Vote.objects.create(entry=entry, votekey=votekey, points=4)
+
+        self.client.cookies['votekey'] = 'secret'
+        response = self.client.get(reverse('available-entries', args=[compo.pk]))
+        checked = [radio for radio in response.content.decode().split('<input') if 'checked' in radio]
+        self.assertIn(f'name="{entry.pk}-points" value="4"', ''.join(checked))
+
+
+def query_plans(func):
+    """Runs func and returns the EXPLAIN QUERY PLAN lines of every SELECT it made"""
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    plans = {}
+    with connection.cursor() as cursor:
+        for query in queries:
+            if query['sql'].startswith('SELECT'):
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plans[query['sql']] = [row[-1] for row in cursor.fetchall()]
+    return plans
+
+
+class QueryPlanTests(TestCase):
+    """The hot queries of voting and results have to use indexes instead of full table scans"""
+
+    def setUp(self):
+        self.compo = create_compo(entry_count=5, voting_status=CompoVotingStatus.OPEN)
+        self.votekey = VoteKey.objects.create(party=self.compo.party, key='secret')
+        for entry in self.compo.entries.all()[:2]:
+            Vote.objects.create(entry=entry, votekey=self.votekey, points=3)
+
+    def assertNoFullScans(self, func):
+        plans = query_plans(func)
+        self.assertTrue(plans)
+        for sql, plan in plans.items():
+            scans = [line for line in plan if line.startswith('SCAN ')]
+            self.assertFalse(scans, f"Full scan in the plan of {sql}: {plan}")
+        return plans
+
+    def test_votekey_lookup(self):
+        self.assertNoFullScans(lambda: VoteKeyCache(10).resolve('secret'))
+
+    def test_available_entries(self):
+        self.client.cookies['votekey'] = 'secret'
+        self.assertNoFullScans(lambda: self.client.get(reverse('available-entries', args=[self.compo.pk])))
+
+    def test_entries_are_not_sorted(self):
+        plans = self.assertNoFullScans(lambda: list(self.compo.entries.all()))
+        for plan in plans.values():
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_results(self):
+        self.assertNoFullScans(lambda: compo_results(self.compo))
+        self.assertNoFullScans(lambda: list(party_results(self.compo.party).for_compo(self.compo.pk)))
+
+
+class VoteKeyResolverTests(TestCase):
+    def setUp(self):
+        party = Party.objects.create(title='Test party')
+        self.votekey = VoteKey.objects.create(party=party, key='secret')
+
+    def test_resolved_key_is_cached(self):
+        self.assertEqual(resolve_votekey('secret'), self.votekey.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_votekey('secret'), self.votekey.pk)
+
+    def test_invalid_key(self):
+        self.assertIsNone(resolve_votekey('wrong'))
+        self.assertIsNone(resolve_votekey(None))
+
+    def test_deleted_key_is_invalidated(self):
+        resolve_votekey('secret')
+        self.votekey.delete()
+        self.assertIsNone(resolve_votekey('secret'))
+
+    def test_invalidation_reaches_other_processes(self):
+        other_worker = VoteKeyCache(maxsize=10)
+        self.assertEqual(other_worker.resolve('secret'), self.votekey.pk)
+        VoteKey.objects.filter(pk=self.votekey.pk).update(key='changed')
+        invalidate_votekeys()
+        self.assertIsNone(other_worker.resolve('secret'))
+
+    def test_cache_is_bounded(self):
+        cache = VoteKeyCache(maxsize=2)
+        for i in range(3):
+            VoteKey.objects.create(party=self.votekey.party, key=f'key-{i}')
+        for i in range(3):
+            cache.resolve(f'key-{i}')
+        self.assertEqual(list(cache.entries), ['key-1', 'key-2'])
+
+
+class VoteKeyImportTests(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(title='Test party')
+        VoteKey.objects.create(party=self.party, key='existing')
+
+    def test_counts(self):
+        lines = ['new-1\n', 'existing\n', '\n', 'new-2', 'new-1', 'x' * 200]
+        counts = import_votekeys(self.party.pk, lines)
+        self.assertEqual(counts, {'imported': 2, 'duplicates': 2, 'invalid': 1, 'total': 5})
+        self.assertEqual(VoteKey.objects.filter(party=self.party).count(), 3)
+
+    def test_batched(self):
+        lines = (f'key-{i}' for i in range(2500))
+        with CaptureQueriesContext(connection) as queries:
+            counts = import_votekeys(self.party.pk, lines)
+        self.assertEqual(counts['imported'], 2500)
+        self.assertLess(len(queries), 20)
+
+    def test_admin_file_upload(self):
+        admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('keys.txt', '\ufeffone\r\ntwo\r\nexisting\r\n'.encode())
+        response = self.client.post('/admin/vote/votekey/import-keys/', {'party': self.party.pk, 'file': upload}, follow=True)
+        self.assertContains(response, 'Imported 2 of 3 keys, 1 were duplicates')
+        self.assertTrue(VoteKey.objects.filter(party=self.party, key='one').exists())
+
+    def test_generate(self):
+        out = StringIO()
+        call_command('generate_votekeys', 'Test party', 1500, stdout=out, stderr=StringIO())
+        keys = out.getvalue().split()
+        self.assertEqual(len(set(keys)), 1500)
+        self.assertEqual(VoteKey.objects.filter(party=self.party, key__in=keys).count(), 1500)
+        self.assertTrue(all(len(key) == 8 for key in keys))
+
+    def test_generate_unknown_party(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_votekeys', 'Other party', 10)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.compo = create_compo(entry_count=3)
+        self.admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(self.admin)
+
+    def create_votes(self, count):
+        start = VoteKey.objects.count()
+        keys = VoteKey.objects.bulk_create(
+            VoteKey(party=self.compo.party, key=f'key-{start + i}') for i in range(count)
+        )
+        entries = list(self.compo.entries.all())
+        Vote.objects.bulk_create(Vote(entry=entries[i % 3], votekey=key, points=i % 6) for i, key in enumerate(keys))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow(self):
+        for name in ['admin:vote_vote_changelist', 'admin:vote_votekey_changelist']:
+            self.create_votes(5)
+            few = self.count_queries(reverse(name))
+            self.create_votes(150)
+            self.assertEqual(self.count_queries(reverse(name)), few, name)
+
+    def test_keyset_pages(self):
+        self.create_votes(250)
+        url = reverse('admin:vote_vote_changelist')
+        response = self.client.get(url)
+        first_page = [vote.pk for vote in response.context['cl'].result_list]
+        self.assertEqual(first_page, list(Vote.objects.order_by('-pk').values_list('pk', flat=True)[:100]))
+        self.assertContains(response, 'About 250 votes')
+
+        response = self.client.get(url + response.context['cl'].next_page_url)
+        second_page = [vote.pk for vote in response.context['cl'].result_list]
+        self.assertEqual(second_page, list(Vote.objects.order_by('-pk').values_list('pk', flat=True)[100:200]))
+        self.assertContains(response, 'Next page')
+
+        response = self.client.get(url, {'after': min(second_page)})
+        self.assertEqual(len(response.context['cl'].result_list), 50)
+        self.assertNotContains(response, 'Next page')
+
+    def test_sorted_by_votes(self):
+        self.create_votes(3)
+        Vote.objects.create(entry=self.compo.entries.last(), votekey=VoteKey.objects.first(), points=1)
+        # Sorted by the third column, the vote count, descending
+        response = self.client.get(reverse('admin:vote_votekey_changelist'), {'o': '-3'})
+        result_list = response.context['cl'].result_list
+        self.assertEqual(result_list[0], VoteKey.objects.first())
+        self.assertEqual(result_list[0].vote_count, 2)
+
+
+class AvailableEntriesConditionalGetTests(TestCase):
+    def setUp(self):
+        self.compo = create_compo(entry_count=3, voting_status=CompoVotingStatus.LIVE, current_entry_pos=2)
+        self.votekey = VoteKey.objects.create(party=self.compo.party, key='secret')
+        self.client.cookies['votekey'] = 'secret'
+        self.url = reverse('available-entries', args=[self.compo.pk])
+
+    def get_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_unchanged_entries_are_not_modified(self):
+        etag = self.get_etag()
+        resolve_votekey('secret')
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_changes_with_live_state(self):
+        etag = self.get_etag()
+        self.compo.current_entry_pos = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            self.compo.save()
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b'<form'), 3)
+
+    def test_etag_changes_with_own_votes(self):
+        etag = self.get_etag()
+        entry = self.compo.entries.first()
+        self.client.post(reverse('vote-entry', args=[entry.pk]), {f'{entry.pk}-entry': entry.pk, f'{entry.pk}-points': 5})
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_etag_ignores_other_keys_votes(self):
+        etag = self.get_etag()
+        other = VoteKey.objects.create(party=self.compo.party, key='other')
+        Vote.objects.create(entry=self.compo.entries.first(), votekey=other, points=5)
+        self.assertEqual(self.get_etag(), etag)
+
+    def test_etag_changes_with_entries(self):
+        etag = self.get_etag()
+        entry = self.compo.entries.first()
+        entry.title = 'Renamed'
+        entry.save()
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_etag_changes_when_entries_are_reordered(self):
+        etag = self.get_etag()
+        # Like the drag and drop of the admin, without changing updated_at
+        entries = list(self.compo.entries.all())
+        entries[0].order, entries[1].order = entries[1].order, entries[0].order
+        Entry.objects.bulk_update(entries, ['order'])
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+
+class EntryScoreTests(TestCase):
+    def setUp(self):
+        self.compo = create_compo(entry_count=2)
+        self.entry, self.other_entry = self.compo.entries.all()
+        self.keys = [VoteKey.objects.create(party=self.compo.party, key=f'key-{i}') for i in range(3)]
+
+    def test_tally_follows_votes(self):
+        vote = Vote.objects.create(entry=self.entry, votekey=self.keys[0], points=5)
+        Vote.objects.create(entry=self.entry, votekey=self.keys[1], points=3)
+        score = EntryScore.objects.get(entry=self.entry)
+        self.assertEqual((score.total, score.vote_count), (8, 2))
+        self.assertEqual(score.histogram, [0, 0, 0, 1, 0, 1])
+
+        vote.points = 1
+        vote.save()
+        score.refresh_from_db()
+        self.assertEqual((score.total, score.vote_count), (4, 2))
+        self.assertEqual(score.histogram, [0, 1, 0, 1, 0, 0])
+
+        vote.delete()
+        score.refresh_from_db()
+        self.assertEqual((score.total, score.vote_count), (3, 1))
+        self.assertEqual(self.entry.entry_total_points, 3)
+        self.assertEqual(self.other_entry.entry_total_points, 0)
+
+    def test_vote_endpoint_updates_tally(self):
+        self.client.cookies['votekey'] = 'key-0'
+        url = reverse('vote-entry', args=[self.entry.pk])
+        for points in [2, 4]:
+            self.client.post(url, {f'{self.entry.pk}-entry': self.entry.pk, f'{self.entry.pk}-points': points})
+        self.assertEqual(EntryScore.objects.get(entry=self.entry).total, 4)
+
+    def test_rebuild_and_check(self):
+        Vote.objects.create(entry=self.entry, votekey=self.keys[0], points=5)
+        call_command('rebuild_scores', '--check', stdout=StringIO())
+
+        EntryScore.objects.filter(entry=self.entry).update(total=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_scores', '--check', stdout=StringIO(), stderr=StringIO())
+
+        call_command('rebuild_scores', stdout=StringIO())
+        call_command('rebuild_scores', '--check', stdout=StringIO())
+        self.assertEqual(EntryScore.objects.get(entry=self.entry).total, 5)
+
+    def test_missing_triggers_are_reported(self):
+        self.assertEqual(checks.check_score_triggers(None, databases=['default']), [])
+        with connection.cursor() as cursor:
+            cursor.execute(scores.DROP_TRIGGERS_SQL[0])
+        errors = checks.check_score_triggers(None, databases=['default'])
+        self.assertEqual([error.id for error in errors], ['vote.E001'])
+        self.assertIn('vote_entryscore_insert', errors[0].msg)
+        call_command('rebuild_scores', stdout=StringIO())
+        self.assertEqual(checks.check_score_triggers(None, databases=['default']), [])
+
+
+class CastVoteTests(TestCase):
+    def setUp(self):
+        self.compo = create_compo(entry_count=1, voting_status=CompoVotingStatus.OPEN)
+        self.entry = self.compo.entries.get()
+        self.votekey = VoteKey.objects.create(party=self.compo.party, key='secret')
+
+    def test_upsert_is_a_single_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            vote = Vote.cast(self.entry, self.votekey.pk, 2)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 1)
+        self.assertIn('ON CONFLICT', queries[-1]['sql'])
+        self.assertIsNotNone(vote.pk)
+
+        again = Vote.cast(self.entry, self.votekey.pk, 4)
+        self.assertEqual(again.pk, vote.pk)
+        self.assertEqual(Vote.objects.get().points, 4)
+
+    def test_double_fired_submissions(self):
+        self.client.cookies['votekey'] = 'secret'
+        url = reverse('vote-entry', args=[self.entry.pk])
+        for points in [1, 5]:
+            response = self.client.post(url, {f'{self.entry.pk}-entry': self.entry.pk, f'{self.entry.pk}-points': points})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(Vote.objects.filter(votekey=self.votekey).get().points, 5)
+
+
+class ConcurrentCastVoteTests(TransactionTestCase):
+    def test_concurrent_submissions_from_same_key(self):
+        compo = create_compo(entry_count=1, voting_status=CompoVotingStatus.OPEN)
+        entry = compo.entries.get()
+        votekey = VoteKey.objects.create(party=compo.party, key='secret')
+
+        barrier = threading.Barrier(8)
+        errors = []
+
+        def submit(points):
+            try:
+                barrier.wait()
+                Vote.cast(entry, votekey.pk, points)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=submit, args=[i % 6]) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Vote.objects.filter(entry=entry, votekey=votekey).count(), 1)
+        self.assertEqual(EntryScore.objects.get(entry=entry).vote_count, 1)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('<int:pk>/', views.VoteView.as_view(), name='vote'),
     path('entry/<int:entry_pk>', views.cast_vote_for_entry, name='vote-entry'),
     path('available-entries/<int:compo_pk>', views.entries_to_vote_for, name='available-entries'),
+    path('live/<int:compo_pk>', views.live_state_events, name='live-state-events'),
     path('', views.VoteListView.as_view(), name='vote-list'),
     path('management/', views.VoteManagementView.as_view(), name='vote-management'),
     path('record-entry-pos/', views.record_current_entry, name='record-entry-pos'),
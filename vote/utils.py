@@ -1,15 +1,142 @@
+import itertools
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
 from vote.models import VoteKey
 
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.db import transaction
+
+
+VOTEKEY_BATCH_SIZE = 1000
+
+# Without characters that are easy to mix up when typed from paper
+VOTEKEY_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+
+
+class VoteKeyCache:
+    """
+    Bounded LRU cache from vote key strings to VoteKey ids.
+
+    Only valid keys are cached. Invalidating touches a stamp file under RUNTIME_DIR,
+    which makes the caches of all worker processes clear themselves on their next lookup.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stamp = None
+
+    @property
+    def stamp_path(self):
+        return Path(settings.RUNTIME_DIR) / 'votekeys.stamp'
+
+    def read_stamp(self):
+        try:
+            stat = self.stamp_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def resolve(self, key):
+        stamp = self.read_stamp()
+        with self.lock:
+            if stamp != self.stamp:
+                self.entries.clear()
+                self.stamp = stamp
+            elif key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        votekey_id = VoteKey.objects.filter(key=key).values_list('pk', flat=True).first()
+        if votekey_id is None:
+            return None
+
+        with self.lock:
+            if self.stamp == stamp:
+                self.entries[key] = votekey_id
+                if len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return votekey_id
+
+    def invalidate(self):
+        path = self.stamp_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Replacing the file gives it a new inode, which changes the stamp even
+        # when the file system's timestamps are too coarse to tell writes apart
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        tmp_path.touch()
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.entries.clear()
+            self.stamp = None
 
 
-def get_key(key_msg):
-    try:
-        print(key_msg)
-        return VoteKey.objects.get(key=key_msg)
-    except VoteKey.DoesNotExist:
+votekey_cache = VoteKeyCache(settings.VOTEKEY_CACHE_SIZE)
+
+
+def resolve_votekey(key):
+    """Returns the id of the VoteKey matching the key, or None if the key is not valid"""
+    if not key:
         return None
+    return votekey_cache.resolve(key)
+
+
+def invalidate_votekeys():
+    votekey_cache.invalidate()
 
 
 def votekey_valid(key):
-    return VoteKey.objects.filter(key=key).exists()
\ No newline at end of file
+    return resolve_votekey(key) is not None
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def insert_votekeys(party_pk, keys):
+    """Inserts the keys of the party in one transaction and returns the ones that didn't exist yet"""
+    keys = list(dict.fromkeys(keys))
+    with transaction.atomic():
+        # The transaction holds the write lock from the start, so the keys
+        # can't be inserted by anyone else between the check and the insert
+        existing = set(VoteKey.objects.filter(party_id=party_pk, key__in=keys).values_list('key', flat=True))
+        new_keys = [key for key in keys if key not in existing]
+        VoteKey.objects.bulk_create([VoteKey(party_id=party_pk, key=key) for key in new_keys], ignore_conflicts=True)
+    return new_keys
+
+
+def import_votekeys(party_pk, lines):
+    """
+    Creates vote keys of the party from lines of text, one key per line, streamed in batches.
+    Returns the numbers of imported, duplicate and invalid keys.
+    """
+    max_length = VoteKey._meta.get_field('key').max_length
+    counts = {'imported': 0, 'duplicates': 0, 'invalid': 0, 'total': 0}
+    keys = (line.decode('utf-8', 'replace') if isinstance(line, bytes) else line for line in lines)
+    keys = (key.strip().lstrip('\ufeff') for key in keys)
+    for batch in batched((key for key in keys if key), VOTEKEY_BATCH_SIZE):
+        valid = [key for key in batch if len(key) <= max_length]
+        imported = len(insert_votekeys(party_pk, valid))
+        counts['total'] += len(batch)
+        counts['invalid'] += len(batch) - len(valid)
+        counts['imported'] += imported
+        counts['duplicates'] += len(valid) - imported
+    # New keys don't invalidate the vote key caches, they only hold keys that exist
+    return counts
+
+
+def generate_votekeys(party_pk, count, length):
+    """Creates count random keys for the party and returns them"""
+    created = []
+    while len(created) < count:
+        batch_size = min(count - len(created), VOTEKEY_BATCH_SIZE)
+        keys = [''.join(secrets.choice(VOTEKEY_ALPHABET) for _ in range(length)) for _ in range(batch_size)]
+        created += insert_votekeys(party_pk, keys)
+    return created
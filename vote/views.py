@@ -1,22 +1,31 @@
+import hashlib
 import json
 
+from asgiref.sync import sync_to_async
+
 from party.mixins import StaffRequiredMixin
-from party.models import Compo, Entry, CompoVotingStatus
+from pms.sqlite3.retry import retry_on_locked
+from party.models import Compo, Entry, CompoVotingStatus, invalidate_active_party
 from vote.forms import VoteLoginForm, VoteForm
 from vote.models import VoteKey, Vote
-from vote.utils import votekey_valid
+from vote.utils import votekey_valid, resolve_votekey
+from vote import live
 from vote.mixins import VoteKeyRequiredMixin
 
 from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, F, FilteredRelation, Max, Q, Sum
 from django.contrib.auth.decorators import user_passes_test
-from django.shortcuts import render, reverse, get_object_or_404
+from django.shortcuts import render, reverse
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.views.generic.edit import FormView
 from django.views.generic.base import TemplateView
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
 from django.template.response import TemplateResponse
-from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed, Http404
 
 # Create your views here.
 class LoginVoteView(FormView):
@@ -43,6 +52,11 @@ class VoteView(VoteKeyRequiredMixin, DetailView):
     model = Compo
     template_name = "vote/vote.html"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['live_state'] = live.get_state(self.object.pk)
+        return context
+
 
 class VoteListView(VoteKeyRequiredMixin, ListView):
     model = Compo
@@ -53,34 +67,76 @@ class VoteManagementView(StaffRequiredMixin, TemplateView):
     template_name = "vote/management.html"
 
 def get_votekey(request):
-    found = False
-    votekey = request.COOKIES.get('votekey')
-    if not votekey_valid(votekey):
-        return None, found
-    found = True
-    votekey = VoteKey.objects.get(key=votekey)
-    return votekey, found
+    votekey_id = resolve_votekey(request.COOKIES.get('votekey'))
+    return votekey_id, votekey_id is not None
+
+# Mixes the pk and the order of an entry, so that the sum over the entries of a
+# compo changes when they are reordered without being saved one by one
+_ENTRY_POSITION = (F('pk') * 65537 + F('order')) % 2147483629
+ENTRY_ORDER_HASH = _ENTRY_POSITION * _ENTRY_POSITION % 2147483629
+
+
+def available_entries_etag(request, compo_pk):
+    """
+    Version stamp of the available entries of a compo as seen by the requesting vote key.
+    Changes whenever the live state, the entries or the key's own votes change.
+    """
+    votekey_id = resolve_votekey(request.COOKIES.get('votekey'))
+    if votekey_id is None:
+        return None
+    state = live.get_state(compo_pk)
+    if state is None:
+        return None
+
+    stamp = Entry.objects.filter(compo_id=compo_pk).annotate(
+        own_votes=FilteredRelation('votes', condition=Q(votes__votekey_id=votekey_id)),
+    ).aggregate(
+        entry_count=Count('pk'),
+        entries_updated=Max('updated_at'),
+        entries_order=Sum(ENTRY_ORDER_HASH),
+        vote_count=Count('own_votes'),
+        votes_updated=Max('own_votes__updated_at'),
+    )
+    version = (
+        votekey_id, state['current_entry_pos'], state['voting_status'],
+        stamp['entry_count'], stamp['entries_updated'], stamp['entries_order'], stamp['vote_count'], stamp['votes_updated'],
+    )
+    return hashlib.md5(repr(version).encode(), usedforsecurity=False).hexdigest()
+
 
 @csrf_exempt
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=available_entries_etag)
 def entries_to_vote_for(request, compo_pk):
-    votekey, found = get_votekey(request)
+    votekey_id, found = get_votekey(request)
     if not found:
         raise ValidationError
-    compo = get_object_or_404(Compo, pk=compo_pk)
-    compo_voting_status = compo.voting_status
+    state = live.get_state(compo_pk)
+    if state is None:
+        raise Http404
+    compo_voting_status = state['voting_status']
+    entries = Entry.objects.filter(compo_id=compo_pk)
 
     if compo_voting_status == CompoVotingStatus.LIVE:
-        entries = compo.entries.all()[:compo.current_entry_pos]
+        entries = entries[:state['current_entry_pos']]
     elif compo_voting_status == CompoVotingStatus.OPEN:
-        entries = compo.entries.all()
+        entries = entries.all()
     elif compo_voting_status == CompoVotingStatus.CLOSED:
-        entries = compo.entries.none()
+        entries = entries.none()
     else:
-        entries = compo.entries.none()
+        entries = entries.none()
+
+    entries = list(entries)
+    votes = {}
+    if entries:
+        votes = {
+            vote.entry_id: vote
+            for vote in Vote.objects.filter(votekey_id=votekey_id, entry__compo_id=compo_pk)
+        }
 
     entry_list = []
     for entry in entries:
-        vote = Vote.objects.filter(votekey=votekey, entry=entry).first()
+        vote = votes.get(entry.pk)
         if vote:
             form = VoteForm(prefix=entry.pk, instance=vote)
         else:
@@ -90,12 +146,32 @@ def entries_to_vote_for(request, compo_pk):
     return render(request, "vote/entries_formset.html", context={'entry_list': entry_list})
 
 
+async def live_state_events(request, compo_pk):
+    """
+    Server-sent event stream that notifies voters whenever the live state of the compo changes,
+    so their browsers don't have to poll available entries
+    """
+    if not isinstance(request, ASGIRequest):
+        # Sync workers can't hold the connection open. 204 tells EventSource
+        # not to reconnect, so the client keeps polling instead.
+        return HttpResponse(status=204)
+
+    if not await sync_to_async(votekey_valid)(request.COOKIES.get('votekey')):
+        raise ValidationError("No votekey found")
+
+    if await sync_to_async(live.get_state)(compo_pk) is None:
+        raise Http404
+
+    return live.event_stream(compo_pk)
+
+
 @csrf_exempt
+@retry_on_locked
 def cast_vote_for_entry(request, entry_pk):
     if request.method != 'POST':
         return HttpResponseNotAllowed(['POST'])
 
-    votekey, found = get_votekey(request)
+    votekey_id, found = get_votekey(request)
     if not found:
         raise ValidationError("No votekey found")
 
@@ -105,11 +181,7 @@ def cast_vote_for_entry(request, entry_pk):
         entry = form.cleaned_data['entry']
         points = form.cleaned_data['points']
 
-        vote, _ = Vote.objects.update_or_create(
-            entry=form.cleaned_data['entry'],
-            votekey=votekey,
-            defaults={'points': form.cleaned_data['points']}
-        )
+        vote = Vote.cast(entry, votekey_id, points)
 
         return render(request, 'vote/entry.html', context={
             'form': VoteForm(instance=vote, prefix=entry_pk), 'entry': entry})
@@ -122,6 +194,7 @@ def is_superuser(user):
 
 @csrf_exempt
 @user_passes_test(is_superuser)
+@retry_on_locked
 def record_current_entry(request):
     if request.method != 'POST':
         return HttpResponseNotAllowed(['POST'])
@@ -129,13 +202,37 @@ def record_current_entry(request):
     data = json.loads(request.body)
     current_entry = data.get('current_entry')
     compo_pk = data.get('compo_pk')
+    seq = data.get('seq')
 
     if not compo_pk:
         return HttpResponseBadRequest('compo_pk missing')
-    
-    if current_entry:
-        compo = Compo.objects.get(pk=compo_pk)
-        compo.current_entry_pos = current_entry
-        compo.save()
-
-    return JsonResponse({'success': True})
\ No newline at end of file
+    if type(compo_pk) is not int or not 0 < compo_pk < 2 ** 63:
+        return HttpResponseBadRequest('Invalid compo_pk')
+    # Has to fit the 64-bit signed integers of the database and the live state
+    if seq is not None and not (type(seq) is int and 0 <= seq < 2 ** 63):
+        return HttpResponseBadRequest('Invalid seq')
+    try:
+        current_entry_pos = int(current_entry) if current_entry else None
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest('Invalid current_entry')
+    # Range of PositiveIntegerField
+    if current_entry_pos is not None and not 0 <= current_entry_pos < 2 ** 31:
+        return HttpResponseBadRequest('Invalid current_entry')
+
+    if seq is None:
+        # Slideshows loaded before positions were numbered, the position is always written
+        applied = 0
+        if current_entry_pos is not None:
+            applied = Compo.objects.filter(pk=compo_pk).update(current_entry_pos=current_entry_pos)
+    else:
+        fields = {'beamer_seq': seq}
+        if current_entry_pos is not None:
+            fields['current_entry_pos'] = current_entry_pos
+        # Requests can arrive out of order, positions older than the last one are ignored
+        applied = Compo.objects.filter(pk=compo_pk, beamer_seq__lt=seq).update(**fields)
+    if applied:
+        # Queryset updates don't send the signals that invalidate the cached compos
+        invalidate_active_party()
+        live.publish_beamer_position(compo_pk, seq, current_entry_pos, data.get('slide'))
+
+    return JsonResponse({'success': True, 'applied': bool(applied)})